@@ -0,0 +1,261 @@
+# Compares the character by character tokenizer used before with the current one,
+# runs on CircuitPython as well as on a host computer
+#
+# on a board copy the peterbay_prompt folder to lib, on a host computer run it
+# from the repository root with: python -m examples.tokenizer_benchmark
+
+try:
+    from time import monotonic_ns
+except ImportError:
+    from time import monotonic
+
+    def monotonic_ns() -> int:
+        return int(monotonic() * 1000000000)
+
+
+import random
+from peterbay_prompt.tokenizer import Tokenizer
+
+COMMANDS = [
+    "set led 1",
+    "get temperature --unit=celsius",
+    "i2c scan --bus=1 -v 0x40",
+    "config name='living room' brightness=80",
+    'wifi connect --ssid="home network" --password=secret -fq',
+    "log show --lines 100 --level=debug --follow",
+]
+ROUNDS = 200
+CORPUS_SIZE = 500
+WORDS = ["set", "led", "0x40", "living room", 'say "hi"', "it's", "a\\b", "100"]
+
+
+class LegacyTokenizer:
+    def __init__(self):
+        self._long_option_delimiters = ["="]
+
+    def set_long_option_delimiters(self, delimiters: list):
+        self._long_option_delimiters = delimiters
+
+    def _read_until_chars(self, text: str, pos: int, chars: list) -> int:
+        len_text = len(text)
+        while pos < len_text and text[pos] not in chars:
+            pos += 1
+
+        return pos
+
+    def _read_exclude_chars(self, text: str, pos: int, chars: list) -> int:
+        len_text = len(text)
+        while pos < len_text and text[pos] in chars:
+            pos += 1
+
+        return pos
+
+    def _quoted_text(self, tokens: list, text: str, start: int, quote_char: str) -> int:
+        pos = self._read_until_chars(text, start, [quote_char])
+        tokens.append(
+            {
+                "type": "text",
+                "content": text[start:pos],
+                "quote": quote_char,
+            }
+        )
+        return pos + 1
+
+    def _long_option(self, tokens: list, text: str, start: int) -> int:
+        pos = self._read_until_chars(text, start, self._long_option_delimiters + [" "])
+        name = text[start:pos]
+        delimiter = text[pos] if pos < len(text) else None
+
+        token = {
+            "type": "long_option",
+            "name": name,
+        }
+
+        if delimiter not in self._long_option_delimiters:
+            token["content"] = True
+            tokens.append(token)
+            return pos
+
+        start = pos + 1
+
+        if len(text) > start:
+            quote = text[start]
+            if quote in ['"', "'"]:
+                pos = self._read_until_chars(text, start + 1, [quote])
+                token["content"] = text[start + 1 : pos]
+                token["quote"] = quote
+                token["delimiter"] = delimiter
+                tokens.append(token)
+                return pos + 1
+
+        pos = self._read_until_chars(text, start, [" "])
+        token["content"] = text[start:pos]
+        token["delimiter"] = delimiter
+        tokens.append(token)
+        return pos
+
+    def _short_option(self, tokens: list, text: str, start: int) -> int:
+        pos = self._read_until_chars(text, start, [" "])
+        options = text[start:pos]
+        for option in options:
+            tokens.append(
+                {
+                    "type": "option",
+                    "name": option,
+                    "content": True,
+                    "group": options,
+                }
+            )
+        return pos
+
+    def _text(
+        self, tokens: list, text: str, start: int, support_key_value: bool = False
+    ) -> int:
+        delimiters = [" "]
+        if support_key_value:
+            delimiters.append("=")
+
+        pos = self._read_until_chars(text, start, delimiters)
+        content = text[start:pos]
+
+        if support_key_value:
+            if pos < len(text) and text[pos] == "=" and content.isalpha():
+                tokens.append(
+                    {
+                        "type": "key_value",
+                        "name": content,
+                        "content": text[pos + 1 :],
+                    }
+                )
+                return len(text)
+
+        tokens.append(
+            {
+                "type": "text",
+                "content": content,
+            }
+        )
+        return pos
+
+    def _space(self, tokens: list, text: str, start: int) -> int:
+        pos = self._read_exclude_chars(text, start, [" "])
+        tokens.append(
+            {
+                "type": "space",
+                "content": " " + text[start:pos],
+            }
+        )
+        return pos
+
+    def tokenize(self, text: str, options: dict = {}) -> list:
+        limit = options["limit"] if "limit" in options else None
+        key_value = bool(options["key_value"]) if "key_value" in options else False
+
+        assert limit is None or limit > 0, "Limit must be positive"
+
+        tokens = []
+        i = 0
+        count = 0
+        while i < len(text):
+            char = text[i]
+
+            if char in ['"', "'"]:
+                i = self._quoted_text(tokens, text, i + 1, char)
+
+            elif char == "-":
+                start = i + 1
+                if start < len(text) and text[start] == "-":  # long option
+                    i = self._long_option(tokens, text, start + 1)
+
+                else:  # short option
+                    i = self._short_option(tokens, text, start)
+
+            elif char == " ":
+                i = self._space(tokens, text, i + 1)
+
+            else:
+                i = self._text(tokens, text, i, key_value)
+
+            count += 1
+
+            if limit is None:
+                continue
+
+            if count >= limit:
+                tokens.append(
+                    {
+                        "type": "text",
+                        "content": text[i:],
+                    }
+                )
+                break
+
+        return tokens
+
+
+def benchmark(name: str, function, commands=COMMANDS, options={"key_value": True}):
+    rounds = max(1, ROUNDS * len(COMMANDS) // len(commands))
+    start = monotonic_ns()
+    for _ in range(rounds):
+        for command in commands:
+            function(command, options)
+
+    elapsed = (monotonic_ns() - start) // 1000
+    calls = rounds * len(commands)
+    print(f"{name:<24} {elapsed:>10} us {elapsed / calls:>10.1f} us/command")
+    return elapsed
+
+
+def random_command(tokenizer: Tokenizer) -> tuple:
+    # random tokens written by to_string in the strict mode, so every command
+    # is valid for the strict mode and its tokens are known
+    tokens = [{"type": "text", "content": random.choice(WORDS)}]
+    for _ in range(random.randint(0, 6)):
+        tokens.append({"type": "space", "content": " "})
+        kind = random.randint(0, 3)
+        content = random.choice(WORDS)
+
+        if kind == 0:
+            tokens.append({"type": "text", "content": content})
+        elif kind == 1:
+            tokens.append({"type": "text", "content": content, "quote": '"'})
+        elif kind == 2:
+            token = {"type": "long_option", "name": "level", "content": content}
+            token["delimiter"] = "="
+            tokens.append(token)
+        else:
+            tokens.append({"type": "key_value", "name": "mode", "content": content})
+
+    return tokens, tokenizer.to_string(tokens, True)
+
+
+legacy = LegacyTokenizer()
+tokenizer = Tokenizer()
+
+for command in COMMANDS:
+    expected = legacy.tokenize(command, {"key_value": True})
+    assert tokenizer.tokenize(command, {"key_value": True}) == expected, command
+
+legacy_time = benchmark("legacy tokenize", legacy.tokenize)
+dict_time = benchmark("tokenize", tokenizer.tokenize)
+compact_time = benchmark("tokenize_compact", tokenizer.tokenize_compact)
+
+# tokenize builds the same dicts as the legacy tokenizer, so does the terminal
+# for the lines it returns, only tokenize_compact avoids building them
+print(f"tokenize takes {dict_time / legacy_time:.1f}x the time of legacy")
+print(f"tokenize_compact is {legacy_time / compact_time:.1f}x faster than legacy")
+
+# round trip over a random corpus in the strict mode
+random.seed(1)
+strict = {"key_value": True, "strict": True}
+corpus = []
+for _ in range(CORPUS_SIZE):
+    tokens, command = random_command(tokenizer)
+    assert tokenizer.tokenize(command, strict) == tokens, command
+    corpus.append(command)
+
+characters = sum(len(command) for command in corpus)
+print(f"random corpus: {len(corpus)} commands, {characters} characters")
+default_time = benchmark("corpus tokenize_compact", tokenizer.tokenize_compact, corpus)
+strict_time = benchmark("corpus strict", tokenizer.tokenize_compact, corpus, strict)
+print(f"strict mode takes {strict_time / default_time:.1f}x the time of default mode")
@@ -2,18 +2,172 @@
 #
 # SPDX-License-Identifier: MIT
 
+from .tokenizer import Tokenizer
+
 
 class Alias:
-    _aliases = {}
+    _alias_version = 0
+    _alias_tokenizer = None
+    _alias_options = None
+
+    def __init__(self) -> None:
+        self._aliases = {}
+        self._alias_templates = {}
+
+    def alias_set_tokenizer(self, tokenizer: Tokenizer, options: callable) -> None:
+        # options(command) returns the tokenizer options for lines of a command
+        self._alias_tokenizer = tokenizer
+        self._alias_options = options
+        self.alias_compile()
+
+    def _alias_parameters(self, text: str) -> tuple:
+        # (segments, arity, variadic) for a text with $1 to $9 or $@, segments
+        # are strings and argument indexes, None stands for all arguments
+        segments = []
+        arity = 0
+        variadic = False
+        start = 0
+        pos = text.find("$")
+        while 0 <= pos < len(text) - 1:
+            char = text[pos + 1]
+            if char == "@" or "1" <= char <= "9":
+                segments.append(text[start:pos])
+                if char == "@":
+                    segments.append(None)
+                    variadic = True
+                else:
+                    segments.append(int(char) - 1)
+                    arity = max(arity, int(char))
+
+                start = pos + 2
+
+            pos = text.find("$", pos + 1)
+
+        if not segments:
+            return None
+
+        segments.append(text[start:])
+        return segments, arity, variadic
+
+    def _alias_substitute(self, alias: str, parameters: tuple, arguments: list) -> str:
+        segments, arity, variadic = parameters
+        count = len(arguments)
+        if count < arity or (count > arity and not variadic):
+            expected = f"at least {arity}" if variadic else str(arity)
+            raise ValueError(f"{alias} expects {expected} arguments, got {count}")
+
+        result = []
+        for segment in segments:
+            if segment is None:
+                result.append(" ".join(arguments))
+            elif isinstance(segment, int):
+                result.append(arguments[segment])
+            else:
+                result.append(segment)
+
+        return "".join(result)
+
+    def _alias_expand(self, tokenizer: Tokenizer, options: callable, alias: str):
+        # the command of the alias is expanded while it is another alias, an
+        # alias used in its own expansion is kept as a command like in bash
+        aliases = self._aliases
+        chain = [alias]
+        text = aliases[alias].lstrip()
+
+        while True:
+            tokens = tokenizer.tokenize_compact(text, options(None))
+            command = None
+            type = tokens[0][0] & tokenizer.TOKEN_TYPE_MASK if tokens else None
+            if type == tokenizer.TOKEN_TEXT:
+                command = tokenizer.token_content(text, tokens[0])
+
+            if command not in aliases or command == chain[-1]:
+                break
+
+            if command in chain:
+                raise ValueError("Alias cycle: " + " -> ".join(chain + [command]))
+
+            chain.append(command)
+            rest = text[tokenizer.token_end(tokens[0]) :]
+            expansion = aliases[command].lstrip()
+            parameters = self._alias_parameters(expansion)
+            if parameters is None:
+                text = expansion + rest
+                continue
+
+            # arguments of an alias with parameters are known here, they are
+            # words of this alias which may be its own parameters
+            arguments = tokenizer.token_words(text, tokens[1:])
+            if "$@" in arguments:
+                raise ValueError(f"$@ can't be passed to {command}")
+
+            text = self._alias_substitute(command, parameters, arguments)
+
+        return (
+            command,
+            text,
+            tokenizer.tokenize_compact(text, options(command)),
+            self._alias_parameters(text),
+        )
+
+    def alias_compile(self) -> None:
+        # every alias is compiled to the expanded command, its text and tokens
+        tokenizer = self._alias_tokenizer or Tokenizer()
+        options = self._alias_options or (lambda command: {})
+        templates = {}
+        for alias in self._aliases:
+            templates[alias] = self._alias_expand(tokenizer, options, alias)
+
+        self._alias_templates = templates
+        self._alias_version += 1
 
     def alias_add(self, alias: str, command: str) -> None:
+        previous = self._aliases.get(alias, None)
         self._aliases[alias] = command
 
+        try:
+            self.alias_compile()
+        except ValueError:
+            if previous is None:
+                self._aliases.pop(alias)
+            else:
+                self._aliases[alias] = previous
+
+            raise
+
     def alias_remove(self, alias: str) -> None:
-        self._aliases.pop(alias, None)
+        if self._aliases.pop(alias, None) is not None:
+            self.alias_compile()
 
     def alias_list(self) -> dict:
         return self._aliases
 
     def alias_get(self, alias: str) -> str:
         return self._aliases.get(alias, None)
+
+    def alias_template(self, alias: str) -> tuple:
+        # (command, text, compact tokens, parameters) of the expanded alias or
+        # None, parameters are None for an alias without $1 to $9 and $@
+        return self._alias_templates.get(alias, None)
+
+    def alias_substitute(self, alias: str, arguments: list) -> str:
+        # text of the alias with parameters replaced by the arguments,
+        # ValueError for a wrong number of arguments
+        return self._alias_substitute(alias, self._alias_templates[alias][3], arguments)
+
+    def alias_compiled(self) -> dict:
+        # expanded text of every alias with the number of its arguments
+        compiled = {}
+        for alias, template in self._alias_templates.items():
+            text = template[1]
+            parameters = template[3]
+            if parameters is not None:
+                _, arity, variadic = parameters
+                text += f"  (arguments: {arity}{'+' if variadic else ''})"
+
+            compiled[alias] = text
+
+        return compiled
+
+    def alias_version(self) -> int:
+        return self._alias_version
@@ -2,39 +2,286 @@
 #
 # SPDX-License-Identifier: MIT
 
+_AUTOCOMPLETE_WORD_SEPARATORS = "_-./ "
+_AUTOCOMPLETE_FUZZY_CACHE_SIZE = 16
+
+
+def _autocomplete_boundaries(entry: str) -> int:
+    # bit mask of the positions where a word starts
+    mask = 1
+    for i in range(1, len(entry)):
+        previous = entry[i - 1]
+        if previous in _AUTOCOMPLETE_WORD_SEPARATORS or (
+            previous.islower() and entry[i].isupper()
+        ):
+            mask |= 1 << i
+
+    return mask
+
+
+def _autocomplete_score(query: str, entry: str, boundaries: int) -> int:
+    # query and entry are lower case, returns -1 when the query characters
+    # are not a subsequence of the entry
+    score = 0
+    previous = -2
+    position = 0
+
+    for char in query:
+        position = entry.find(char, position)
+        if position < 0:
+            return -1
+
+        score += 1
+        if position == previous + 1:
+            score += 4
+
+        if boundaries >> position & 1:
+            score += 3
+
+        previous = position
+        position += 1
+
+    return score
+
 
 class Autocomplete:
+    AUTOCOMPLETE_CYCLE = 0
+    AUTOCOMPLETE_LIST = 1
+
     _autocomplete_enabled = True
+    _autocomplete_mode = AUTOCOMPLETE_CYCLE
+    _autocomplete_listing = False
+    _autocomplete_page = -1
     _autocomplete_list = []
     _autocomplete_buffer = None
     _autocomplete_index = 0
+    _autocomplete_start = 0
+    _autocomplete_end = 0
+    _autocomplete_provider = None
+    _autocomplete_matches = None
+    _autocomplete_before = ""
+    _autocomplete_after = ""
+    _autocomplete_fuzzy = False
+    _autocomplete_fuzzy_data = None
+    _autocomplete_fuzzy_cache = None
 
     def autocomplete_set(self, autocomplete: list) -> None:
         if not self._autocomplete_enabled:
             return
 
-        self._autocomplete_list = autocomplete
+        self._autocomplete_list = sorted(autocomplete)
+        self._autocomplete_fuzzy_prepare()
+        self.autocomplete_clean()
+
+    def autocomplete_enable_fuzzy(self, value: bool) -> None:
+        self._autocomplete_fuzzy = value
+        self._autocomplete_fuzzy_prepare()
+        self.autocomplete_clean()
+
+    def _autocomplete_fuzzy_prepare(self) -> None:
+        self._autocomplete_fuzzy_cache = {}
+        if not self._autocomplete_fuzzy:
+            self._autocomplete_fuzzy_data = None
+            return
+
+        self._autocomplete_fuzzy_data = [
+            (entry.lower(), _autocomplete_boundaries(entry))
+            for entry in self._autocomplete_list
+        ]
+
+    def _autocomplete_fuzzy_match(self, query: str) -> list:
+        cache = self._autocomplete_fuzzy_cache
+        indexes = cache.get(query, None)
+        if indexes is not None:
+            return indexes
+
+        # entries matching a longer query are a subset of the entries matching
+        # its prefix, so typing more characters filters the cached result
+        indexes = range(len(self._autocomplete_list))
+        for length in range(len(query) - 1, 0, -1):
+            cached = cache.get(query[:length], None)
+            if cached is not None:
+                indexes = cached
+                break
+
+        entries = self._autocomplete_list
+        data = self._autocomplete_fuzzy_data
+        lower_query = query.lower()
+        scored = []
+        for index in indexes:
+            entry, boundaries = data[index]
+            score = _autocomplete_score(lower_query, entry, boundaries)
+            if score >= 0:
+                scored.append((-score, entries[index], index))
+
+        scored.sort()
+        indexes = [index for _, _, index in scored]
+
+        if len(cache) >= _AUTOCOMPLETE_FUZZY_CACHE_SIZE:
+            cache.clear()
+
+        cache[query] = indexes
+        return indexes
 
     def autocomplete_clean(self) -> None:
         self._autocomplete_index = 0
         self._autocomplete_buffer = None
+        self._autocomplete_matches = None
+        self._autocomplete_listing = False
+        self._autocomplete_page = -1
+
+    def autocomplete_set_mode(self, mode: int) -> None:
+        assert mode in (
+            self.AUTOCOMPLETE_CYCLE,
+            self.AUTOCOMPLETE_LIST,
+        ), "Unknown autocomplete mode"
+        self._autocomplete_mode = mode
+        self.autocomplete_clean()
+
+    def autocomplete_candidates(self) -> list:
+        if self._autocomplete_matches is None:
+            return []
+
+        return self._autocomplete_matches[
+            self._autocomplete_start : self._autocomplete_end
+        ]
+
+    def autocomplete_set_provider(self, provider: callable) -> None:
+        # provider(text_before_cursor) returns None when there is nothing to
+        # complete, or a tuple (start, candidates) where start is the offset
+        # of the completed token and candidates is any iterable of strings,
+        # None candidates means the list given to autocomplete_set
+        self._autocomplete_provider = provider
+
+    def _autocomplete_bisect(self, prefix: str, after: bool) -> int:
+        # entries are sorted, so the ones starting with the prefix form one range,
+        # comparing only the first len(prefix) characters finds its start or end
+        entries = self._autocomplete_list
+        length = len(prefix)
+        low = 0
+        high = len(entries)
+
+        while low < high:
+            middle = (low + high) // 2
+            head = entries[middle][:length]
+            if head < prefix or (after and head == prefix):
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def _autocomplete_match(self, prefix: str, candidates) -> None:
+        if self._autocomplete_fuzzy and prefix:
+            if candidates is None:
+                entries = self._autocomplete_list
+                matches = [
+                    entries[index] for index in self._autocomplete_fuzzy_match(prefix)
+                ]
+
+            else:
+                query = prefix.lower()
+                scored = []
+                for candidate in candidates:
+                    score = _autocomplete_score(
+                        query, candidate.lower(), _autocomplete_boundaries(candidate)
+                    )
+                    if score >= 0:
+                        scored.append((-score, candidate))
+
+                scored.sort()
+                matches = [candidate for _, candidate in scored]
+
+            self._autocomplete_start = 0
+            self._autocomplete_end = len(matches)
+
+        elif candidates is None:
+            matches = self._autocomplete_list
+            self._autocomplete_start = self._autocomplete_bisect(prefix, False)
+            self._autocomplete_end = self._autocomplete_bisect(prefix, True)
+
+        else:
+            matches = sorted(
+                candidate for candidate in candidates if candidate.startswith(prefix)
+            )
+            self._autocomplete_start = 0
+            self._autocomplete_end = len(matches)
+
+        self._autocomplete_buffer = prefix
+        self._autocomplete_matches = matches
+
+    def _autocomplete_next(self) -> str:
+        matches = self._autocomplete_matches
+        start = self._autocomplete_start
+        count = self._autocomplete_end - start
+
+        if count <= 0:
+            return None
+
+        index = self._autocomplete_index
+        self._autocomplete_index += 1
+
+        if self._autocomplete_mode == self.AUTOCOMPLETE_CYCLE:
+            return matches[start + index % count]
+
+        if count == 1:
+            return matches[start]
+
+        common = self._autocomplete_buffer
+        if not self._autocomplete_fuzzy or not common:
+            # the range is sorted, so its first and last entry share the prefix
+            # common to all matches
+            first = matches[start]
+            last = matches[start + count - 1]
+            length = 0
+            while length < len(first) and first[length] == last[length]:
+                length += 1
+
+            common = first[:length]
+
+        if index == 0 and len(common) > len(self._autocomplete_buffer):
+            return common
+
+        self._autocomplete_listing = True
+        self._autocomplete_page += 1
+        return common
 
     def autocomplete_process(self, entry: str) -> str:
         if not self._autocomplete_enabled or not self._autocomplete_list:
             return entry
 
+        self._autocomplete_listing = False
         if self._autocomplete_buffer is None:
-            self._autocomplete_buffer = entry
+            self._autocomplete_match(entry, None)
 
-        matches = [
-            match_entry
-            for match_entry in self._autocomplete_list
-            if match_entry.startswith(self._autocomplete_buffer)
-        ]
+        new_entry = self._autocomplete_next()
+        return entry if new_entry is None else new_entry
+
+    def autocomplete_process_at(self, entry: str, cursor: int) -> (str, int):
+        if not self._autocomplete_enabled:
+            return entry, cursor
+
+        if self._autocomplete_provider is None:
+            entry = self.autocomplete_process(entry)
+            return entry, len(entry)
+
+        self._autocomplete_listing = False
+        if self._autocomplete_buffer is None:
+            completion = self._autocomplete_provider(entry[:cursor])
+            if completion is None:
+                return entry, cursor
+
+            start, candidates = completion
+            self._autocomplete_match(entry[start:cursor], candidates)
+            self._autocomplete_before = entry[:start]
+            self._autocomplete_after = entry[cursor:]
+
+        new_entry = self._autocomplete_next()
+        if new_entry is None:
+            return entry, cursor
 
-        if matches:
-            new_entry = matches[self._autocomplete_index % len(matches)]
-            self._autocomplete_index += 1
-            return new_entry
+        before = self._autocomplete_before + new_entry
+        return before + self._autocomplete_after, len(before)
 
-        return entry
+    def autocomplete_listing(self) -> bool:
+        return self._autocomplete_listing
@@ -0,0 +1,273 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 Petr Vavrin / pvavrin@gmail.com
+#
+# SPDX-License-Identifier: MIT
+
+_ZERO_WIDTH_RANGES = (
+    (0x0300, 0x036F),
+    (0x1AB0, 0x1AFF),
+    (0x1DC0, 0x1DFF),
+    (0x200B, 0x200F),
+    (0x20D0, 0x20FF),
+    (0xFE20, 0xFE2F),
+)
+
+_WIDE_RANGES = (
+    (0x1100, 0x115F),
+    (0x2E80, 0xA4CF),
+    (0xAC00, 0xD7A3),
+    (0xF900, 0xFAFF),
+    (0xFE30, 0xFE4F),
+    (0xFF00, 0xFF60),
+    (0xFFE0, 0xFFE6),
+    (0x1F300, 0x1F64F),
+    (0x1F900, 0x1F9FF),
+    (0x20000, 0x3FFFD),
+)
+
+
+def char_width(code: int) -> int:
+    if code < 0x0300:
+        return 1
+
+    for start, end in _ZERO_WIDTH_RANGES:
+        if start <= code <= end:
+            return 0
+
+    for start, end in _WIDE_RANGES:
+        if start <= code <= end:
+            return 2
+
+    return 1
+
+
+def _utf8_length(code: int) -> int:
+    if code < 0x80:
+        return 1
+
+    if code < 0x800:
+        return 2
+
+    return 3 if code < 0x10000 else 4
+
+
+class GapBuffer:
+    def __init__(self, size: int, utf8: bool = False) -> None:
+        assert size >= 0, "Size must be positive"
+        self._data = bytearray(size)
+        self._gap_start = 0
+        self._gap_end = size
+        self.utf8 = utf8
+
+    def __len__(self) -> int:
+        return len(self._data) - self._gap_end + self._gap_start
+
+    @property
+    def cursor(self) -> int:
+        return self._gap_start
+
+    @property
+    def free(self) -> int:
+        return self._gap_end - self._gap_start
+
+    def resize(self, size: int) -> None:
+        size = max(size, len(self))
+        if size == len(self._data):
+            return
+
+        data = bytearray(size)
+        gap_start = self._gap_start
+        tail = len(self._data) - self._gap_end
+        data[:gap_start] = self._data[:gap_start]
+        data[size - tail :] = self._data[self._gap_end :]
+        self._data = data
+        self._gap_end = size - tail
+
+    def clear(self) -> None:
+        self._gap_start = 0
+        self._gap_end = len(self._data)
+
+    def set(self, text: str) -> None:
+        self.clear()
+        length = self.encoded_length(text)
+        if length > len(self._data):
+            self.resize(length)
+
+        self.insert(text)
+
+    def byte_at(self, index: int) -> int:
+        if index >= self._gap_start:
+            index += self._gap_end - self._gap_start
+
+        return self._data[index]
+
+    def encoded_length(self, text: str) -> int:
+        if not self.utf8:
+            return len(text)
+
+        length = 0
+        for char in text:
+            length += _utf8_length(ord(char))
+
+        return length
+
+    def char_count(self) -> int:
+        if not self.utf8:
+            return len(self)
+
+        # continuation bytes are not counted
+        count = 0
+        for part in (self.head(), self.tail()):
+            for byte in part:
+                if byte & 0xC0 != 0x80:
+                    count += 1
+
+        return count
+
+    def char_offset(self, count: int) -> int:
+        # converts a number of characters before (negative) or after the cursor
+        # to a number of bytes
+        if not self.utf8:
+            if count < 0:
+                return max(count, -self._gap_start)
+
+            return min(count, len(self._data) - self._gap_end)
+
+        byte_at = self.byte_at
+        position = self._gap_start
+        length = len(self)
+
+        while count < 0 and position > 0:
+            position -= 1
+            while position > 0 and byte_at(position) & 0xC0 == 0x80:
+                position -= 1
+            count += 1
+
+        while count > 0 and position < length:
+            position += 1
+            while position < length and byte_at(position) & 0xC0 == 0x80:
+                position += 1
+            count -= 1
+
+        return position - self._gap_start
+
+    def width(self, start: int, end: int) -> int:
+        if not self.utf8:
+            return end - start
+
+        byte_at = self.byte_at
+        width = 0
+        position = start
+
+        while position < end:
+            byte = byte_at(position)
+            position += 1
+
+            if byte < 0x80:
+                width += 1
+                continue
+
+            if byte < 0xE0:
+                code = byte & 0x1F
+                count = 1
+
+            elif byte < 0xF0:
+                code = byte & 0x0F
+                count = 2
+
+            else:
+                code = byte & 0x07
+                count = 3
+
+            while count and position < end:
+                code = code << 6 | byte_at(position) & 0x3F
+                position += 1
+                count -= 1
+
+            width += char_width(code)
+
+        return width
+
+    def move(self, count: int) -> int:
+        data = self._data
+        gap_start = self._gap_start
+        gap_end = self._gap_end
+
+        if count < 0:
+            count = max(count, -gap_start)
+            for _ in range(-count):
+                gap_start -= 1
+                gap_end -= 1
+                data[gap_end] = data[gap_start]
+
+        elif count > 0:
+            count = min(count, len(data) - gap_end)
+            for _ in range(count):
+                data[gap_start] = data[gap_end]
+                gap_start += 1
+                gap_end += 1
+
+        self._gap_start = gap_start
+        self._gap_end = gap_end
+        return count
+
+    def insert(self, text: str) -> bool:
+        if self.encoded_length(text) > self._gap_end - self._gap_start:
+            return False
+
+        data = self._data
+        gap_start = self._gap_start
+        for char in text:
+            code = ord(char)
+
+            if code < 0x80:
+                data[gap_start] = code
+                gap_start += 1
+                continue
+
+            length = _utf8_length(code)
+            shift = 6 * (length - 1)
+            data[gap_start] = (0xF00 >> length) & 0xFF | code >> shift
+            gap_start += 1
+
+            while shift:
+                shift -= 6
+                data[gap_start] = 0x80 | (code >> shift) & 0x3F
+                gap_start += 1
+
+        self._gap_start = gap_start
+        return True
+
+    def delete(self, count: int) -> int:
+        if count < 0:
+            count = min(-count, self._gap_start)
+            self._gap_start -= count
+
+        else:
+            count = min(count, len(self._data) - self._gap_end)
+            self._gap_end += count
+
+        return count
+
+    def head(self) -> memoryview:
+        return memoryview(self._data)[: self._gap_start]
+
+    def tail(self) -> memoryview:
+        return memoryview(self._data)[self._gap_end :]
+
+    def text(self, start: int = 0, end: int = None) -> str:
+        encoding = "utf-8" if self.utf8 else "ascii"
+        gap_start = self._gap_start
+        length = len(self)
+        end = length if end is None else min(end, length)
+
+        if end <= gap_start:
+            return str(self._data[start:end], encoding)
+
+        gap = self._gap_end - gap_start
+        if start >= gap_start:
+            return str(self._data[start + gap : end + gap], encoding)
+
+        return str(
+            self._data[start:gap_start] + self._data[self._gap_end : end + gap],
+            encoding,
+        )
@@ -2,37 +2,356 @@
 #
 # SPDX-License-Identifier: MIT
 
+try:
+    from time import monotonic_ns
+except ImportError:
+    from time import monotonic
+
+    def monotonic_ns() -> int:
+        return int(monotonic() * 1000000000)
+
+
+# entries are indexed by their first characters up to this length
+_HISTORY_PREFIX_LENGTH = 4
+
+
+def _history_prefix_keys(entry: str):
+    for length in range(1, min(len(entry), _HISTORY_PREFIX_LENGTH) + 1):
+        yield entry[:length]
+
 
 class History:
     HISTORY_PREV = 1
     HISTORY_NEXT = 2
+    HISTORY_MODE_ALL = 0
+    HISTORY_MODE_PREFIX = 1
     _history_size = 30
-    _history = []
+    _history_max_bytes = 0
+    _history_entries = ()
+    _history_head = 0
+    _history_count = 0
+    _history_bytes = 0
     _history_index = -1
     _history_enabled = True
     _history_actual_entry = ""
+    _history_file = None
+    _history_loaded = True
+    _history_pending = ()
+    _history_pending_time = 0
+    _history_file_lines = 0
+    _history_rewrite = False
+    _history_flush_entries = 8
+    _history_flush_timeout = 0
+    _history_mode = HISTORY_MODE_ALL
+    _history_serial = 0
+    _history_prefixes = None
+    _history_prefix = None
+
+    def history_set_file(
+        self, path: str, flush_entries: int = 8, flush_timeout_ms: int = 5000
+    ) -> None:
+        # entries are appended to the file in batches, the file is loaded when
+        # the history is used for the first time, entries already in memory are
+        # added after the loaded ones and written with the next flush
+        assert flush_entries > 0, "Flush entries must be positive"
+        assert flush_timeout_ms >= 0, "Flush timeout must be positive"
+        self.history_flush()
+        pending = self.history_get() if self._history_loaded else []
+        self._history_file = path
+        self._history_flush_entries = flush_entries
+        self._history_flush_timeout = flush_timeout_ms * 1000000
+        self._history_pending = pending if path is not None else []
+        self._history_pending_time = monotonic_ns()
+        self._history_loaded = path is None
+        self._history_rewrite = False
+
+    def _history_load(self) -> None:
+        pending = self._history_pending
+        self._history_loaded = True
+        self.history_clean()
+        self._history_rewrite = False
+
+        lines = 0
+        try:
+            with open(self._history_file, "r") as file:
+                for line in file:
+                    lines += 1
+                    entry = line.rstrip("\r\n")
+                    if entry and self._history_size:
+                        self._history_add(entry)
+
+        except OSError:
+            pass
+
+        for entry in pending:
+            if self._history_size:
+                self._history_add(entry)
+
+        self._history_pending = pending
+        self._history_file_lines = lines
+        self._history_index = self._history_count
+
+    def history_flush(self) -> None:
+        if self._history_file is None:
+            return
+
+        if not self._history_pending and not self._history_rewrite:
+            return
+
+        # the file is rewritten with the entries kept in memory when it grows
+        # to twice the history size, otherwise the new entries are appended
+        pending = self._history_pending
+        lines = self._history_file_lines + len(pending)
+        rewrite = self._history_rewrite or lines >= 2 * max(self._history_size, 1)
+        if rewrite:
+            pending = self.history_get()
+            lines = len(pending)
+
+        try:
+            with open(self._history_file, "w" if rewrite else "a") as file:
+                for entry in pending:
+                    file.write(entry + "\n")
+
+        except OSError:
+            # read only filesystem, the history stays in memory only
+            lines = self._history_file_lines
+
+        self._history_file_lines = lines
+        self._history_pending = []
+        self._history_rewrite = False
+
+    def history_poll(self) -> None:
+        if not self._history_pending or not self._history_flush_timeout:
+            return
+
+        if monotonic_ns() - self._history_pending_time >= self._history_flush_timeout:
+            self.history_flush()
+
+    def _history_at(self, index: int) -> str:
+        entries = self._history_entries
+        return entries[(self._history_head + index) % len(entries)]
+
+    def _history_evict(self) -> None:
+        entries = self._history_entries
+        head = self._history_head
+
+        prefixes = self._history_prefixes
+        if prefixes is not None:
+            # serial numbers in a bucket are ascending, the evicted entry is the
+            # oldest one, stale numbers are removed once they are half a bucket
+            serial = self._history_serial - self._history_count
+            for key in _history_prefix_keys(entries[head]):
+                bucket = prefixes[key]
+                if bucket[-1] <= serial:
+                    del prefixes[key]
+
+                elif bucket[len(bucket) // 2] <= serial:
+                    position = 0
+                    while bucket[position] <= serial:
+                        position += 1
+
+                    del bucket[:position]
+
+        self._history_bytes -= len(entries[head].encode())
+        entries[head] = None
+        self._history_head = (head + 1) % len(entries)
+        self._history_count -= 1
+
+    def _history_add(self, entry: str) -> None:
+        size = len(entry.encode())
+        max_bytes = self._history_max_bytes
+        if max_bytes and size > max_bytes:
+            return
+
+        entries = self._history_entries
+        if self._history_count == len(entries):
+            self._history_evict()
+
+        while max_bytes and self._history_bytes + size > max_bytes:
+            self._history_evict()
+
+        tail = (self._history_head + self._history_count) % len(entries)
+        entries[tail] = entry
+        self._history_count += 1
+        self._history_bytes += size
+
+        if self._history_prefixes is not None:
+            self._history_prefix_add(entry, self._history_serial)
+
+        self._history_serial += 1
+
+    def _history_prefix_add(self, entry: str, serial: int) -> None:
+        prefixes = self._history_prefixes
+        for key in _history_prefix_keys(entry):
+            bucket = prefixes.get(key, None)
+            if bucket is None:
+                prefixes[key] = [serial]
+            else:
+                bucket.append(serial)
 
     def history_get(self) -> list:
-        return self._history
+        if not self._history_loaded:
+            self._history_load()
+
+        return [self._history_at(i) for i in range(self._history_count)]
 
     def history_set(self, history: list) -> None:
         if self._history_size:
-            self._history = history
-            self._history_index = len(history)
+            self._history_loaded = True
+            self.history_clean()
+            for entry in history[-self._history_size :]:
+                self._history_add(entry)
+
+            self._history_index = self._history_count
 
     def history_clean(self):
-        self._history = []
+        self._history_entries = [None] * self._history_size
+        self._history_head = 0
+        self._history_count = 0
+        self._history_bytes = 0
         self._history_index = -1
+        self._history_pending = []
+        # the cleared history replaces the file, it is not loaded again
+        self._history_loaded = True
+        self._history_rewrite = self._history_file is not None
+        self._history_prefix = None
+        if self._history_mode == self.HISTORY_MODE_PREFIX:
+            self._history_prefixes = {}
 
     def history_set_size(self, size: int):
         assert size >= 0, "History size must be positive"
         if size != self._history_size:
-            self._history = self._history[-size:]
+            history = self.history_get()
+            pending = self._history_pending
+            self._history_size = size
+            self.history_clean()
+            for entry in history[-size:] if size else ():
+                self._history_add(entry)
+
+            self._history_index = self._history_count
+            self._history_pending = pending
+
+    def history_set_max_bytes(self, max_bytes: int):
+        assert max_bytes >= 0, "History max bytes must be positive"
+        if not self._history_loaded:
+            self._history_load()
+
+        self._history_max_bytes = max_bytes
+        if max_bytes:
+            while self._history_bytes > max_bytes:
+                self._history_evict()
 
-        self._history_size = size
+            self._history_index = self._history_count
+
+    def history_set_mode(self, mode: int) -> None:
+        assert mode in (
+            self.HISTORY_MODE_ALL,
+            self.HISTORY_MODE_PREFIX,
+        ), "Unknown history mode"
+        self._history_mode = mode
+        self._history_prefix = None
+        self._history_prefixes = None
+
+        if mode == self.HISTORY_MODE_PREFIX:
+            history = self.history_get()
+            self._history_prefixes = {}
+            serial = self._history_serial - self._history_count
+            for entry in history:
+                self._history_prefix_add(entry, serial)
+                serial += 1
+
+    def _history_prefix_start(self, entry: str) -> None:
+        self._history_prefix = entry
+        self._history_actual_entry = entry
+        self._history_visited = []
+        self._history_visited_pos = -1
+        self._history_seen = {entry}
+        self._history_shown = entry
+        self._history_bucket = None
+        self._history_bucket_pos = self._history_count
+
+        if entry:
+            bucket = self._history_prefixes.get(entry[:_HISTORY_PREFIX_LENGTH], ())
+            self._history_bucket = bucket
+            self._history_bucket_pos = len(bucket)
+
+    def _history_prefix_older(self) -> str:
+        prefix = self._history_prefix
+        seen = self._history_seen
+        bucket = self._history_bucket
+        first = self._history_serial - self._history_count
+        position = self._history_bucket_pos
+
+        while position > 0:
+            position -= 1
+            if bucket is None:
+                index = position
+            else:
+                index = bucket[position] - first
+                if index < 0:
+                    # only already evicted entries are left in the bucket
+                    position = 0
+                    break
+
+            entry = self._history_at(index)
+            if entry in seen or not entry.startswith(prefix):
+                continue
+
+            seen.add(entry)
+            self._history_bucket_pos = position
+            return entry
+
+        self._history_bucket_pos = position
+        return None
+
+    def _history_prefix_action(self, action: int, entry: str) -> str:
+        visited = self._history_visited
+        position = self._history_visited_pos
+
+        if action == self.HISTORY_PREV:
+            if position + 1 < len(visited):
+                position += 1
+
+            else:
+                older = self._history_prefix_older()
+                if older is None:
+                    return entry
+
+                visited.append(older)
+                position += 1
+
+        elif action == self.HISTORY_NEXT:
+            if position < 0:
+                return entry
+
+            position -= 1
+            if position < 0:
+                self._history_visited_pos = position
+                self._history_shown = self._history_actual_entry
+                return self._history_actual_entry
+
+        self._history_visited_pos = position
+        self._history_shown = visited[position]
+        return visited[position]
 
     def history_action(self, action: int, entry: str) -> str:
-        len_history = len(self._history)
+        if not self._history_loaded:
+            self._history_load()
+
+        if self._history_mode == self.HISTORY_MODE_PREFIX:
+            if not self._history_enabled or not self._history_count:
+                return entry
+
+            # editing the shown entry starts a new search with the edited text
+            if self._history_prefix is None or entry != self._history_shown:
+                if action == self.HISTORY_NEXT:
+                    return entry
+
+                self._history_prefix_start(entry)
+
+            return self._history_prefix_action(action, entry)
+
+        len_history = self._history_count
 
         if not self._history_enabled or len_history == 0:
             return entry
@@ -44,14 +363,14 @@ class History:
 
         if action == self.HISTORY_PREV and idx > 0:
             idx -= 1
-            entry = self._history[idx]
+            entry = self._history_at(idx)
 
         elif action == self.HISTORY_NEXT:
             size = len_history - 1
 
-            if self._history and idx < size:
+            if idx < size:
                 idx += 1
-                entry = self._history[idx]
+                entry = self._history_at(idx)
 
             elif idx == size:
                 idx += 1
@@ -68,18 +387,46 @@ class History:
         if not self._history_enabled or self._history_size == 0:
             return None
 
-        len_history = len(self._history)
+        if not self._history_loaded:
+            self._history_load()
+
+        len_history = self._history_count
+
+        self._history_prefix = None
+
+        if not len_history or not self._history_at(len_history - 1) == entry:
+            self._history_add(entry)
 
-        if not len_history or (len_history and not self._history[-1] == entry):
-            self._history.append(entry)
+            if self._history_file is not None:
+                if not self._history_pending:
+                    self._history_pending_time = monotonic_ns()
 
-            if len_history + 1 > self._history_size:
-                self._history.pop(0)
+                self._history_pending.append(entry)
+                if len(self._history_pending) >= self._history_flush_entries:
+                    self.history_flush()
 
-        self._history_index = len(self._history)
+        self._history_index = self._history_count
+
+    def history_search(self, text: str, start: int = None) -> int:
+        # index of the newest entry containing the text at or before start
+        if not self._history_loaded:
+            self._history_load()
+
+        index = self._history_count - 1 if start is None else start
+        while index >= 0:
+            if text in self._history_at(index):
+                return index
+
+            index -= 1
+
+        return -1
 
     def history_get_entry(self, command: str) -> str:
-        if len(command) < 2 or len(self._history) == 0:
+        if not self._history_loaded:
+            self._history_load()
+
+        len_history = self._history_count
+        if len(command) < 2 or len_history == 0:
             return None
 
         if not command[0] == "!":
@@ -90,11 +437,21 @@ class History:
 
         if command[1].isdigit() or command[1] == "-":
             try:
-                return self._history[int(command[1:])]
-            except:
+                index = int(command[1:])
+            except ValueError:
                 return None
 
+            if index < 0:
+                index += len_history
+
+            if 0 <= index < len_history:
+                return self._history_at(index)
+
+            return None
+
         else:
-            for entry in reversed(self._history):
-                if entry.startswith(command[1:]):
+            prefix = command[1:]
+            for i in range(len_history - 1, -1, -1):
+                entry = self._history_at(i)
+                if entry.startswith(prefix):
                     return entry
@@ -3,180 +3,476 @@
 # SPDX-License-Identifier: MIT
 
 from .serial_io import SerialIO
+from .keys import Keys
 
+try:
+    from time import monotonic_ns
+except ImportError:
+    from time import monotonic
 
-class Input(SerialIO):
+    def monotonic_ns() -> int:
+        return int(monotonic() * 1000000000)
+
+
+_INPUT_PASTE_END = b"\x1b[201~"
+
+
+class Input(SerialIO, Keys):
     INPUT_CHAR = 1
     INPUT_CTRL_CODE = 2
     INPUT_ESCAPE_CODE = 3
     INPUT_DATA = 4
 
+    _INPUT_STATE_GROUND = 0
+    _INPUT_STATE_ESCAPE = 1
+    _INPUT_STATE_CSI = 2
+    _INPUT_STATE_SS3 = 3
+    _INPUT_STATE_PASTE = 4
+    _INPUT_STATE_UTF8 = 5
+
+    _input_paste_limit = 1024
+    _input_source = None
+
     _input_slecial_keys = {
-        "A": "UP",
-        "B": "DOWN",
-        "C": "RIGHT",
-        "D": "LEFT",
-        "F": "END",
-        "H": "HOME",
-        "P": "F1",
-        "Q": "F2",
-        "R": "F3",
-        "S": "F4",
+        "A": Keys.KEY_UP,
+        "B": Keys.KEY_DOWN,
+        "C": Keys.KEY_RIGHT,
+        "D": Keys.KEY_LEFT,
+        "F": Keys.KEY_END,
+        "H": Keys.KEY_HOME,
+        "P": Keys.KEY_F1,
+        "Q": Keys.KEY_F2,
+        "R": Keys.KEY_F3,
+        "S": Keys.KEY_F4,
     }
 
     _input_parameter_codes = {
-        "1": "HOME",
-        "2": "INSERT",
-        "3": "DELETE",
-        "4": "END",
-        "5": "PGUP",
-        "6": "PGDW",
-        "7": "HOME",
-        "8": "END",
-        "15": "F5",
-        "17": "F6",
-        "18": "F7",
-        "19": "F8",
-        "20": "F9",
-        "21": "F10",
-        "23": "F11",
-        "24": "F12",
+        "1": Keys.KEY_HOME,
+        "2": Keys.KEY_INSERT,
+        "3": Keys.KEY_DELETE,
+        "4": Keys.KEY_END,
+        "5": Keys.KEY_PGUP,
+        "6": Keys.KEY_PGDW,
+        "7": Keys.KEY_HOME,
+        "8": Keys.KEY_END,
+        "15": Keys.KEY_F5,
+        "17": Keys.KEY_F6,
+        "18": Keys.KEY_F7,
+        "19": Keys.KEY_F8,
+        "20": Keys.KEY_F9,
+        "21": Keys.KEY_F10,
+        "23": Keys.KEY_F11,
+        "24": Keys.KEY_F12,
     }
 
     _input_escape_modifiers = {
-        "~": "",
-        "2": "SHIFT",
-        "3": "ALT",
-        "4": "ALT_SHIFT",
-        "5": "CONTROL",
-        "6": "CONTROL_SHIFT",
-        "7": "CONTROL_ALT",
-        "8": "CONTROL_ALT_SHIFT",
+        "2": Keys.KEY_MOD_SHIFT,
+        "3": Keys.KEY_MOD_ALT,
+        "4": Keys.KEY_MOD_ALT | Keys.KEY_MOD_SHIFT,
+        "5": Keys.KEY_MOD_CTRL,
+        "6": Keys.KEY_MOD_CTRL | Keys.KEY_MOD_SHIFT,
+        "7": Keys.KEY_MOD_CTRL | Keys.KEY_MOD_ALT,
+        "8": Keys.KEY_MOD_CTRL | Keys.KEY_MOD_ALT | Keys.KEY_MOD_SHIFT,
     }
 
-    def _input_read_in_range(
-        self,
-        from_char_ord: int,
-        to_char_ord: int,
-        char: str = None,
-        read_next: bool = True,
-    ):
-        read = self._serial_read
-        buffer = ""
-        if char is None:
-            char = read(1).decode("ascii")
-
-        char_ord = ord(char)
-
-        while from_char_ord <= char_ord <= to_char_ord:
-            buffer += char
-            if read_next:
-                char = read(1).decode("ascii")
-                char_ord = ord(char)
-
-            else:
-                char = None
-                break
-
-        return buffer, char
+    def __init__(self, serial: object, buffer_size: int = 64) -> None:
+        super().__init__(serial)
+        assert buffer_size > 0, "Input buffer size must be positive"
+        self._input_buffer = bytearray(buffer_size)
+        self._input_view = memoryview(self._input_buffer)
+        self._input_queue = []
+        self._input_queue_pos = 0
+        self._input_state = self._INPUT_STATE_GROUND
+        self._input_sequence = bytearray(16)
+        self._input_sequence_length = 0
+        self._input_sequence_time = 0
+        self._input_escape_timeout = 30000000
+        self._input_paste_timeout = 2000000000
+        self._input_paste = bytearray()
+        self._input_paste_match = 0
+        self._input_utf8 = False
+        self._input_utf8_code = 0
+        self._input_utf8_remaining = 0
+        self._input_utf8_minimum = 0
+
+    def _input_share(self, other: object) -> None:
+        # other reads events decoded by this input, so components on the same
+        # serial port keep keys typed ahead in one queue
+        other._input_source = self
+
+    def enable_utf8(self, value: bool) -> None:
+        super().enable_utf8(value)
+        self._input_utf8 = value
+        if self._input_state == self._INPUT_STATE_UTF8:
+            self._input_state = self._INPUT_STATE_GROUND
+
+    def input_set_escape_timeout(self, timeout_ms: int) -> None:
+        assert timeout_ms >= 0, "Escape timeout must be positive"
+        self._input_escape_timeout = timeout_ms * 1000000
+
+    def input_set_paste_timeout(self, timeout_ms: int) -> None:
+        # an open bracketed paste is not ended by the escape timeout, only by
+        # ESC[201~ or when no byte arrives for this time
+        assert timeout_ms >= 0, "Paste timeout must be positive"
+        self._input_paste_timeout = timeout_ms * 1000000
 
     def _input_decode_escape_code(
         self, parameter: str, intermediate: str, final: str
-    ) -> str:
+    ) -> int:
         modifier = None
-        modifier_code = ""
+        modifier_code = 0
         key_code = self._input_slecial_keys.get(final, None) if final != "~" else None
 
         if not parameter and not intermediate:
             return key_code
 
         if ";" in parameter:
-            parameter, modifier = parameter.split(";")
+            # sequences with more parameters, like modifyOtherKeys ESC[27;5;13~
+            # or mouse reports, and unknown modifiers are not decoded
+            parameter, _, modifier = parameter.partition(";")
             modifier_code = self._input_escape_modifiers.get(modifier, None)
+            if not modifier_code:
+                return None
 
         if parameter == "1" and modifier_code and key_code:
-            return f"{modifier_code}_{key_code}"
+            return modifier_code | key_code
 
         elif parameter and not intermediate and final == "~":
             parameter_code = self._input_parameter_codes.get(parameter, None)
             if parameter_code:
                 if modifier_code:
-                    return f"{modifier_code}_{parameter_code}"
+                    return modifier_code | parameter_code
                 else:
                     return parameter_code
 
         return None
 
-    def _input_read_escape_code(self) -> str:
-        read = self._serial_read
-        code = read(1).decode("ascii")
-        ord_code = ord(code)
+    def _input_decode_csi(self, final: int) -> tuple:
+        # For Control Sequence Introducer, or CSI, commands, the ESC [
+        # (written as \e[ or \033[ in several programming and scripting languages)
+        # is followed by any number (including none) of "parameter bytes" in the range 0x30–0x3F (ASCII 0–9:;<=>?),
+        # then by any number of "intermediate bytes" in the range 0x20–0x2F (ASCII space and !"#$%&'()*+,-./),
+        # then finally by a single "final byte" in the range 0x40–0x7E (ASCII @A–Z[\]^_`a–z{|}~).[5]: 5.4
+
+        sequence = self._input_sequence
+        len_sequence = self._input_sequence_length
+        final = _INPUT_CHARS[final]
+
+        if not len_sequence:
+            code = self._input_slecial_keys.get(final, None)
+            if code:
+                return self.INPUT_ESCAPE_CODE, code, None
+
+            return self.INPUT_ESCAPE_CODE, self.KEY_UNKNOWN, "[" + final
+
+        split = 0
+        while split < len_sequence and sequence[split] >= 0x30:
+            split += 1
+
+        parameter = str(sequence[:split], "ascii")
+        intermediate = str(sequence[split:len_sequence], "ascii")
+
+        decoded_escape = self._input_decode_escape_code(
+            parameter, intermediate, final
+        )
+        if decoded_escape:
+            return self.INPUT_ESCAPE_CODE, decoded_escape, None
+
+        raw = f"[{parameter}{intermediate}{final}"
+        return self.INPUT_ESCAPE_CODE, self.KEY_UNKNOWN, raw
+
+    def _input_decode(self, data: memoryview) -> None:
+        emit = self._input_queue.append
+        state = self._input_state
+        sequence = self._input_sequence
+        len_sequence = self._input_sequence_length
+        utf8 = self._input_utf8
+        utf8_code = self._input_utf8_code
+        utf8_remaining = self._input_utf8_remaining
+        utf8_minimum = self._input_utf8_minimum
+
+        for byte in data:
+            if state == self._INPUT_STATE_UTF8:
+                if byte & 0xC0 == 0x80:
+                    utf8_code = utf8_code << 6 | byte & 0x3F
+                    utf8_remaining -= 1
+                    if not utf8_remaining:
+                        state = self._INPUT_STATE_GROUND
+                        # overlong forms, surrogates and code points above
+                        # U+10FFFF are dropped
+                        if utf8_minimum <= utf8_code <= 0x10FFFF and not (
+                            0xD800 <= utf8_code <= 0xDFFF
+                        ):
+                            emit((self.INPUT_CHAR, utf8_code, chr(utf8_code)))
+
+                    continue
+
+                # invalid continuation, the partial character is dropped
+                # and the byte is decoded from the ground state
+                state = self._INPUT_STATE_GROUND
+
+            if state == self._INPUT_STATE_GROUND:
+                if byte == 27:
+                    state = self._INPUT_STATE_ESCAPE
+
+                elif byte < 128:
+                    emit(_INPUT_GROUND_EVENTS[byte])
+
+                elif utf8 and 0xC2 <= byte <= 0xF4:
+                    state = self._INPUT_STATE_UTF8
+                    if byte < 0xE0:
+                        utf8_code = byte & 0x1F
+                        utf8_remaining = 1
+                        utf8_minimum = 0x80
+                    elif byte < 0xF0:
+                        utf8_code = byte & 0x0F
+                        utf8_remaining = 2
+                        utf8_minimum = 0x800
+                    else:
+                        utf8_code = byte & 0x07
+                        utf8_remaining = 3
+                        utf8_minimum = 0x10000
+
+            elif state == self._INPUT_STATE_PASTE:
+                if self._input_paste_add(byte):
+                    state = self._INPUT_STATE_GROUND
+                    emit((self.INPUT_DATA, self.KEY_PASTE, self._input_paste_text()))
+
+            elif state == self._INPUT_STATE_ESCAPE:
+                state = self._INPUT_STATE_GROUND
+
+                if byte == 91:  # char [
+                    len_sequence = 0
+                    state = self._INPUT_STATE_CSI
+
+                elif byte == 79:  # char O
+                    state = self._INPUT_STATE_SS3
+
+                elif byte < 128:
+                    emit(_INPUT_ALT_EVENTS[byte])
+
+            elif state == self._INPUT_STATE_SS3:
+                state = self._INPUT_STATE_GROUND
+
+                if byte < 128:
+                    char = _INPUT_CHARS[byte]
+                    code = self._input_slecial_keys.get(char, None)
+                    if code:
+                        emit((self.INPUT_ESCAPE_CODE, code, None))
+                    else:
+                        emit((self.INPUT_ESCAPE_CODE, self.KEY_UNKNOWN, "O" + char))
+
+            elif 0x20 <= byte <= 0x3F:
+                if len_sequence < len(sequence):
+                    sequence[len_sequence] = byte
+                    len_sequence += 1
 
-        if ord_code == 91:  # char [
-            # For Control Sequence Introducer, or CSI, commands, the ESC [
-            # (written as \e[ or \033[ in several programming and scripting languages)
-            # is followed by any number (including none) of "parameter bytes" in the range 0x30–0x3F (ASCII 0–9:;<=>?),
-            # then by any number of "intermediate bytes" in the range 0x20–0x2F (ASCII space and !"#$%&'()*+,-./),
-            # then finally by a single "final byte" in the range 0x40–0x7E (ASCII @A–Z[\]^_`a–z{|}~).[5]: 5.4
+            else:
+                state = self._INPUT_STATE_GROUND
+
+                if byte == 126 and self._input_is_paste_start(len_sequence):
+                    state = self._INPUT_STATE_PASTE
+                    self._input_paste = bytearray()
+                    self._input_paste_match = 0
+
+                elif 0x40 <= byte <= 0x7E:
+                    self._input_sequence_length = len_sequence
+                    emit(self._input_decode_csi(byte))
+
+        self._input_state = state
+        self._input_sequence_length = len_sequence
+        self._input_utf8_code = utf8_code
+        self._input_utf8_remaining = utf8_remaining
+        self._input_utf8_minimum = utf8_minimum
+
+    def _input_is_paste_start(self, len_sequence: int) -> bool:
+        # bracketed paste starts with ESC[200~ and ends with ESC[201~
+        sequence = self._input_sequence
+        return (
+            len_sequence == 3
+            and sequence[0] == 50
+            and sequence[1] == 48
+            and sequence[2] == 48
+        )
+
+    def _input_paste_add(self, byte: int) -> bool:
+        paste = self._input_paste
+        match = self._input_paste_match
+
+        if byte == _INPUT_PASTE_END[match]:
+            match += 1
+            if match == len(_INPUT_PASTE_END):
+                self._input_paste_match = 0
+                return True
+
+            self._input_paste_match = match
+            return False
+
+        if len(paste) + match < self._input_paste_limit:
+            paste.extend(_INPUT_PASTE_END[:match])
+
+            if byte != 27:
+                paste.append(byte)
+
+        self._input_paste_match = 1 if byte == 27 else 0
+        return False
+
+    def _input_paste_text(self) -> str:
+        paste = self._input_paste
+        end = len(paste)
+
+        while end and paste[end - 1] in (10, 13):
+            end -= 1
+
+        # line breaks and tabs become spaces, other control bytes are dropped
+        utf8 = self._input_utf8
+        length = 0
+        for i in range(end):
+            byte = paste[i]
+            if byte in (9, 10, 13):
+                byte = 32
+
+            elif byte < 32 or byte == 127 or (byte > 127 and not utf8):
+                continue
+
+            paste[length] = byte
+            length += 1
+
+        try:
+            text = str(paste[:length], "utf-8" if utf8 else "ascii")
+        except UnicodeError:
+            text = str(bytes(byte for byte in paste[:length] if byte < 128), "ascii")
+
+        self._input_paste = bytearray()
+        return text
+
+    def _input_flush_sequence(self) -> None:
+        state = self._input_state
+        self._input_state = self._INPUT_STATE_GROUND
+
+        if state == self._INPUT_STATE_UTF8:
+            # an incomplete character is dropped
+            return
+
+        if state == self._INPUT_STATE_PASTE:
+            self._input_paste.extend(_INPUT_PASTE_END[: self._input_paste_match])
+            self._input_paste_match = 0
+            text = self._input_paste_text()
+            self._input_queue.append((self.INPUT_DATA, self.KEY_PASTE, text))
+            return
+
+        if state == self._INPUT_STATE_ESCAPE:
+            self._input_queue.append((self.INPUT_ESCAPE_CODE, self.KEY_ESC, None))
+            return
+
+        if state == self._INPUT_STATE_SS3:
+            raw = "O"
+
+        else:
+            sequence = self._input_sequence[: self._input_sequence_length]
+            raw = "[" + str(sequence, "ascii")
+
+        self._input_queue.append((self.INPUT_ESCAPE_CODE, self.KEY_UNKNOWN, raw))
+
+    def _input_fill(self) -> None:
+        serial = self._serial
+
+        try:
+            # waiting bytes are read first, they may complete a sequence
+            waiting = serial.in_waiting
+            if waiting:
+                buffer = self._input_view
+                if waiting < len(buffer):
+                    buffer = buffer[:waiting]
+
+                count = serial.readinto(buffer)
+                if count:
+                    self._input_decode(buffer[:count])
+                    self._input_sequence_time = monotonic_ns()
+
+            if self._input_state == self._INPUT_STATE_GROUND or serial.in_waiting:
+                return
 
-            char = read(1).decode("ascii")
-            parameter, char = self._input_read_in_range(0x30, 0x3F, char)
-            intermediate, char = self._input_read_in_range(0x20, 0x2F, char)
-            final, char = self._input_read_in_range(0x40, 0x7E, char, False)
+            # the timeout runs from the last received byte, when the rest of the
+            # sequence did not arrive in time, the bytes collected so far are
+            # reported as they are
+            timeout = self._input_escape_timeout
+            if self._input_state == self._INPUT_STATE_PASTE:
+                timeout = self._input_paste_timeout
 
-            decoded_escape = self._input_decode_escape_code(
-                parameter, intermediate, final
-            )
-            if decoded_escape:
-                return decoded_escape
+            elapsed = monotonic_ns() - self._input_sequence_time
+            if elapsed >= timeout:
+                self._input_flush_sequence()
 
-            return f"{code}{parameter}{intermediate}{final}"
+        except KeyboardInterrupt:
+            self._input_queue.append((self.INPUT_CTRL_CODE, self.KEY_CTRL_C, None))
 
-        elif 0 < ord_code < 32:
-            char = chr(ord_code + 64)
-            return f"CTRL_ALT_{char}"
+    def input_read_event(self) -> (int, int, str):
+        if self._input_source is not None:
+            return self._input_source.input_read_event()
 
-        elif ord_code == 79:
-            ext_code = read(1).decode("ascii")
-            return self._input_slecial_keys.get(ext_code, f"{code}{ext_code}")
+        queue = self._input_queue
 
-        elif 96 < ord_code < 123:
-            char = chr(ord_code - 32)
-            return f"ALT_{char}"
+        if self._input_queue_pos >= len(queue):
+            queue.clear()
+            self._input_queue_pos = 0
+            self._input_fill()
+
+            if not queue:
+                return None, None, None
 
-        return code
+        event = queue[self._input_queue_pos]
+        self._input_queue_pos += 1
+        return event
+
+    def input_read_code(self) -> (int, int):
+        type, code, _ = self.input_read_event()
+        return type, code
 
     def input_read_key(self) -> (int, str):
-        if self._serial.in_waiting:
-            try:
-                char = self._serial_read(1).decode("ascii")
-
-                ord_char = ord(char)
-
-                if ord_char == 27:
-                    if not self._serial.in_waiting:
-                        return self.INPUT_ESCAPE_CODE, "ESC"
-
-                    try:
-                        return self.INPUT_ESCAPE_CODE, self._input_read_escape_code()
-
-                    except UnicodeError:
-                        return None, None
-
-                elif 0 <= ord_char < 32:
-                    char = chr(ord_char + 64)
-                    return self.INPUT_CTRL_CODE, f"CTRL_{char}"
-
-                elif 32 <= ord_char < 127:
-                    return self.INPUT_CHAR, char
-
-                elif ord_char == 127:
-                    return self.INPUT_CTRL_CODE, "BACKSPACE"
-
-            except KeyboardInterrupt:
-                return self.INPUT_CTRL_CODE, "CTRL_C"
-
-            except UnicodeError:
-                return None, None
-
-        return None, None
+        type, code, text = self.input_read_event()
+        if type is None:
+            return None, None
+
+        return type, text if text is not None else self.key_name(code)
+
+    def input_read_events(self, max_keys: int = 1, deadline_us: int = None):
+        assert max_keys is None or max_keys > 0, "Max keys must be positive"
+        assert deadline_us is None or deadline_us >= 0, "Deadline must be positive"
+
+        if deadline_us is not None:
+            deadline = monotonic_ns() + deadline_us * 1000
+
+        count = 0
+        while max_keys is None or count < max_keys:
+            event = self.input_read_event()
+            if event[0] is None:
+                return
+
+            yield event
+            count += 1
+
+            if deadline_us is not None and monotonic_ns() >= deadline:
+                return
+
+    def input_read_keys(self, max_keys: int = 1, deadline_us: int = None):
+        for type, code, text in self.input_read_events(max_keys, deadline_us):
+            yield type, text if text is not None else self.key_name(code)
+
+
+# prebuilt events for single bytes, so decoding a key does not allocate
+_INPUT_CHARS = tuple(chr(code) for code in range(128))
+_INPUT_GROUND_EVENTS = tuple(
+    (Input.INPUT_CTRL_CODE, Keys.KEY_MOD_CTRL | code + 64, None)
+    if code < 32
+    else (Input.INPUT_CTRL_CODE, Keys.KEY_BACKSPACE, None)
+    if code == 127
+    else (Input.INPUT_CHAR, code, _INPUT_CHARS[code])
+    for code in range(128)
+)
+_INPUT_ALT_EVENTS = tuple(
+    (Input.INPUT_ESCAPE_CODE, Keys.KEY_MOD_CTRL | Keys.KEY_MOD_ALT | code + 64, None)
+    if 0 < code < 32
+    else (Input.INPUT_ESCAPE_CODE, Keys.KEY_MOD_ALT | code, None)
+    for code in range(128)
+)
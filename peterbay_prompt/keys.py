@@ -0,0 +1,160 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 Petr Vavrin / pvavrin@gmail.com
+#
+# SPDX-License-Identifier: MIT
+
+_KEY_SPECIAL_NAMES = (
+    "ESC",
+    "BACKSPACE",
+    "UP",
+    "DOWN",
+    "RIGHT",
+    "LEFT",
+    "HOME",
+    "END",
+    "INSERT",
+    "DELETE",
+    "PGUP",
+    "PGDW",
+    "F1",
+    "F2",
+    "F3",
+    "F4",
+    "F5",
+    "F6",
+    "F7",
+    "F8",
+    "F9",
+    "F10",
+    "F11",
+    "F12",
+    "PASTE",
+    "UNKNOWN",
+)
+
+_KEY_MODIFIER_NAMES = (
+    "",
+    "SHIFT",
+    "ALT",
+    "ALT_SHIFT",
+    "CONTROL",
+    "CONTROL_SHIFT",
+    "CONTROL_ALT",
+    "CONTROL_ALT_SHIFT",
+)
+
+_KEY_NAMES = {}
+_KEY_CODES = {}
+
+
+class Keys:
+    # key code = modifier bits | base key, base key is a unicode code point
+    # or one of the special keys placed right after the unicode range
+    KEY_MOD_SHIFT = 0x200000
+    KEY_MOD_ALT = 0x400000
+    KEY_MOD_CTRL = 0x800000
+    KEY_MOD_MASK = 0xE00000
+    KEY_BASE_MASK = 0x1FFFFF
+    KEY_SPECIAL = 0x110000
+
+    KEY_ESC = 0x110000
+    KEY_BACKSPACE = 0x110001
+    KEY_UP = 0x110002
+    KEY_DOWN = 0x110003
+    KEY_RIGHT = 0x110004
+    KEY_LEFT = 0x110005
+    KEY_HOME = 0x110006
+    KEY_END = 0x110007
+    KEY_INSERT = 0x110008
+    KEY_DELETE = 0x110009
+    KEY_PGUP = 0x11000A
+    KEY_PGDW = 0x11000B
+    KEY_F1 = 0x11000C
+    KEY_F2 = 0x11000D
+    KEY_F3 = 0x11000E
+    KEY_F4 = 0x11000F
+    KEY_F5 = 0x110010
+    KEY_F6 = 0x110011
+    KEY_F7 = 0x110012
+    KEY_F8 = 0x110013
+    KEY_F9 = 0x110014
+    KEY_F10 = 0x110015
+    KEY_F11 = 0x110016
+    KEY_F12 = 0x110017
+    KEY_PASTE = 0x110018
+    KEY_UNKNOWN = 0x110019
+
+    KEY_TAB = 0x800049  # CTRL_I
+    KEY_ENTER = 0x80004D  # CTRL_M
+    KEY_CTRL_C = 0x800043
+
+    def _key_name(self, code: int) -> str:
+        base = code & self.KEY_BASE_MASK
+        modifiers = code >> 21
+
+        if base >= self.KEY_SPECIAL:
+            name = _KEY_SPECIAL_NAMES[base - self.KEY_SPECIAL]
+            if modifiers:
+                return _KEY_MODIFIER_NAMES[modifiers] + "_" + name
+
+            return name
+
+        char = chr(base)
+        if code & self.KEY_MOD_CTRL:
+            return ("CTRL_ALT_" if code & self.KEY_MOD_ALT else "CTRL_") + char
+
+        if code & self.KEY_MOD_ALT:
+            # only ALT with a lower case letter has its own name, other
+            # characters typed with ALT are reported as the character itself
+            return "ALT_" + char.upper() if "a" <= char <= "z" else char
+
+        return char
+
+    def key_name(self, code: int) -> str:
+        # only names of the special keys are cached, typed characters would
+        # grow the cache without a limit
+        if code & self.KEY_BASE_MASK < self.KEY_SPECIAL:
+            return self._key_name(code)
+
+        name = _KEY_NAMES.get(code, None)
+        if name is None:
+            name = self._key_name(code)
+            _KEY_NAMES[code] = name
+
+        return name
+
+    def _key_code(self, name: str) -> int:
+        if len(name) == 1:
+            return ord(name)
+
+        if name in _KEY_SPECIAL_NAMES:
+            return self.KEY_SPECIAL + _KEY_SPECIAL_NAMES.index(name)
+
+        for prefix, modifiers in (
+            ("CTRL_ALT_", self.KEY_MOD_CTRL | self.KEY_MOD_ALT),
+            ("CTRL_", self.KEY_MOD_CTRL),
+            ("ALT_", self.KEY_MOD_ALT),
+        ):
+            if name.startswith(prefix) and len(name) == len(prefix) + 1:
+                char = name[-1]
+                if modifiers == self.KEY_MOD_ALT:
+                    char = char.lower()
+
+                return modifiers | ord(char)
+
+        modifier, _, special = name.rpartition("_")
+        if modifier in _KEY_MODIFIER_NAMES and special in _KEY_SPECIAL_NAMES:
+            modifiers = _KEY_MODIFIER_NAMES.index(modifier) << 21
+            return modifiers | self.KEY_SPECIAL + _KEY_SPECIAL_NAMES.index(special)
+
+        raise ValueError(f"Unknown key name: {name}")
+
+    def key_code(self, name: str) -> int:
+        if len(name) == 1:
+            return ord(name)
+
+        code = _KEY_CODES.get(name, None)
+        if code is None:
+            code = self._key_code(name)
+            _KEY_CODES[name] = code
+
+        return code
@@ -17,6 +17,7 @@ class Menu(SerialIO):
     def __init__(self, serial: object) -> None:
         super().__init__(serial)
         self.prompt = Prompt(serial)
+        self._io_share(self.prompt)
 
     def set_config(self, menu_config: dict = None) -> None:
         self._menu_config = menu_config
@@ -169,27 +170,33 @@ class Menu(SerialIO):
     def keyboard_interrupt(self) -> None:
         self.prompt.keyboard_interrupt()
 
-    def read_non_blocking(self, prompt_string: str = "> ") -> list:
-        entry = self.prompt.read_non_blocking(prompt_string)
-        if entry is None:
-            return None
+    def read_non_blocking(
+        self, prompt_string: str = "> ", max_keys: int = 1, deadline_us: int = None
+    ) -> list:
+        try:
+            entry = self.prompt.read_non_blocking(prompt_string, max_keys, deadline_us)
+            if entry is None:
+                return None
 
-        user_input = entry.strip()
-        if user_input == "0":
-            top_level = self.action_back()
+            user_input = entry.strip()
+            if user_input == "0":
+                top_level = self.action_back()
 
-            if top_level and self._enable_exit:
-                self.write("\r\n")
-                return True
+                if top_level and self._enable_exit:
+                    self.write("\r\n")
+                    return True
 
-        elif user_input == "reset":
-            self.action_reset()
-            self.render()
+            elif user_input == "reset":
+                self.action_reset()
+                self.render()
 
-        elif user_input == "menu":
-            self.render()
+            elif user_input == "menu":
+                self.render()
 
-        else:
-            self.action_hotkey(user_input)
+            else:
+                self.action_hotkey(user_input)
 
-        return None
+            return None
+
+        finally:
+            self.flush()
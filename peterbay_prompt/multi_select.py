@@ -61,28 +61,28 @@ class MultiSelect(Input):
         self._move_cursor(cursor_pos)
         self._rendered = True
 
-    def _process_key(self, type: int, key: str) -> bool:
+    def _process_key(self, type: int, code: int) -> bool:
         len_options = len(self._options)
         can_move_up = self._active_line > 0
         can_move_down = self._active_line < len_options - 1
 
-        if key == "HOME" and can_move_up:
+        if code == self.KEY_HOME and can_move_up:
             self._move_cursor(-self._active_line)
             self._active_line = 0
 
-        elif key == "END" and can_move_down:
+        elif code == self.KEY_END and can_move_down:
             self._move_cursor(len_options - self._active_line - 1)
             self._active_line = len_options - 1
 
-        elif key == "UP" and can_move_up:
+        elif code == self.KEY_UP and can_move_up:
             self._active_line -= 1
             self._move_cursor(-1)
 
-        elif key == "DOWN" and can_move_down:
+        elif code == self.KEY_DOWN and can_move_down:
             self._active_line += 1
             self._move_cursor(1)
 
-        elif key == " " or key == "x":
+        elif code == 32 or code == 120:  # space or x
             entry_value = self._options[self._active_line]["value"]
             if entry_value in self._active_options:
                 self._active_options.remove(entry_value)
@@ -92,20 +92,24 @@ class MultiSelect(Input):
                 self._active_options.append(entry_value)
                 self.write(f"x\33[D")
 
-        elif key == "CTRL_M":
+        elif code == self.KEY_ENTER:
             self._move_cursor(len_options - self._active_line - 1)
             self.write(f"\r\n")
             return self._active_options
 
         return None
 
-    def read_non_blocking(self):
-        if not self._rendered:
-            self._render()
+    def read_non_blocking(self, max_keys: int = 1, deadline_us: int = None):
+        try:
+            if not self._rendered:
+                self._render()
 
-        type, key = self.input_read_key()
+            for type, code, _ in self.input_read_events(max_keys, deadline_us):
+                result = self._process_key(type, code)
+                if result is not None:
+                    return result
 
-        if type is None:
             return None
 
-        return self._process_key(type, key)
+        finally:
+            self.flush()
@@ -5,6 +5,7 @@
 from .input import Input
 from .autocomplete import Autocomplete
 from .history import History
+from .gap_buffer import GapBuffer, char_width
 
 
 class Prompt(Input, Autocomplete, History):
@@ -17,19 +18,134 @@ class Prompt(Input, Autocomplete, History):
     _new_prompt_string = True
     _commands_enabled = True
     _clear_screen_enabled = True
+    _bracketed_paste_enabled = False
+    _replace_bytes = 0
+    _search_active = False
+    _list_width = 80
+    _list_rows = 10
+    _list_shown = False
+    _edit_listener = None
+
+    KEYMAP_EMACS = {
+        "LEFT": "_key_backward_char",
+        "CTRL_B": "_key_backward_char",
+        "RIGHT": "_key_forward_char",
+        "CTRL_F": "_key_forward_char",
+        "HOME": "_key_beginning_of_line",
+        "CTRL_A": "_key_beginning_of_line",
+        "END": "_key_end_of_line",
+        "CTRL_E": "_key_end_of_line",
+        "BACKSPACE": "_key_backward_delete_char",
+        "CTRL_H": "_key_backward_delete_char",
+        "DELETE": "_key_delete_char",
+        "CTRL_I": "_key_complete",
+        "CTRL_K": "_key_kill_line",
+        "CTRL_U": "_key_unix_line_discard",
+        "ALT_B": "_key_backward_word",
+        "CTRL_W": "_key_unix_word_rubout",
+        "ALT_D": "_key_kill_word",
+        "ALT_F": "_key_forward_word",
+        "CTRL_L": "_key_clear_screen",
+        "CTRL_Y": "_key_yank",
+        "UP": "_key_previous_history",
+        "CTRL_P": "_key_previous_history",
+        "DOWN": "_key_next_history",
+        "CTRL_N": "_key_next_history",
+        "CTRL_R": "_key_reverse_search",
+    }
+
+    KEYMAP_VI = {
+        "LEFT": "_key_backward_char",
+        "RIGHT": "_key_forward_char",
+        "HOME": "_key_beginning_of_line",
+        "END": "_key_end_of_line",
+        "BACKSPACE": "_key_backward_delete_char",
+        "CTRL_H": "_key_backward_delete_char",
+        "DELETE": "_key_delete_char",
+        "CTRL_I": "_key_complete",
+        "CTRL_U": "_key_unix_line_discard",
+        "CTRL_W": "_key_unix_word_rubout",
+        "CTRL_L": "_key_clear_screen",
+        "UP": "_key_previous_history",
+        "DOWN": "_key_next_history",
+        "CTRL_R": "_key_reverse_search",
+        "ESC": "_key_vi_command_mode",
+    }
+
+    KEYMAP_VI_COMMAND = {
+        "h": "_key_backward_char",
+        "LEFT": "_key_backward_char",
+        "l": "_key_forward_char",
+        "RIGHT": "_key_forward_char",
+        "0": "_key_beginning_of_line",
+        "^": "_key_beginning_of_line",
+        "HOME": "_key_beginning_of_line",
+        "$": "_key_end_of_line",
+        "END": "_key_end_of_line",
+        "b": "_key_backward_word",
+        "w": "_key_forward_word",
+        "x": "_key_delete_char",
+        "DELETE": "_key_delete_char",
+        "X": "_key_backward_delete_char",
+        "D": "_key_kill_line",
+        "p": "_key_yank",
+        "k": "_key_previous_history",
+        "UP": "_key_previous_history",
+        "j": "_key_next_history",
+        "DOWN": "_key_next_history",
+        "CTRL_L": "_key_clear_screen",
+        "i": "_key_vi_insert_mode",
+        "a": "_key_vi_append",
+        "A": "_key_vi_append_eol",
+        "I": "_key_vi_insert_bol",
+    }
 
     def __init__(self, serial: object):
         super().__init__(serial)
-        self._clear()
+        self._line = GapBuffer(0)
         self.set_max_length(120)
+        self.set_keymap(self.KEYMAP_EMACS)
+        self.history_clean()
 
     def _clear(self) -> None:
-        self._buffer = ""
-        self._cursor = 0
+        self._set_line("")
+
+    def _set_line(self, text: str) -> None:
+        line = self._line
+        removed = line.text() if self._edit_listener is not None else None
+        line.set(text)
+
+        if removed or (removed is not None and text):
+            self._edit_listener(0, removed, text)
+
+    def _edited(self, start: int, removed: str, inserted: str) -> None:
+        line = self._line
+        position = len(line.text(0, start)) if line.utf8 else start
+        self._edit_listener(position, removed, inserted)
+
+    def set_edit_listener(self, listener: callable) -> None:
+        # listener(position, removed, inserted) is called after every change of
+        # the line, the removed text at position was replaced with the inserted
+        # text, the position is in characters
+        self._edit_listener = listener
+
+    def enable_utf8(self, value: bool) -> None:
+        super().enable_utf8(value)
+        self._clear()
+        self._line.utf8 = value
+        self.set_max_length(self._max_length)
 
     def set_max_length(self, length: int) -> None:
+        # the length is in characters, a UTF-8 character takes up to 4 bytes
         assert length >= 0, "Max length must be positive"
         self._max_length = length
+        self._line.resize(length * 4 if self._line.utf8 else length)
+
+    def set_list_layout(self, width: int = 80, rows: int = 10) -> None:
+        assert width > 0, "List width must be positive"
+        assert rows > 0, "List rows must be positive"
+        self._list_width = width
+        self._list_rows = rows
 
     def enable_commands(self, value: bool) -> None:
         self._commands_enabled = value
@@ -37,9 +153,90 @@ class Prompt(Input, Autocomplete, History):
     def enable_clear_screen(self, value: bool) -> None:
         self._clear_screen_enabled = value
 
+    def enable_bracketed_paste(self, value: bool) -> None:
+        if not value and self._bracketed_paste_enabled:
+            self.write("\33[?2004l")
+
+        self._bracketed_paste_enabled = value
+        self._new_prompt_string = True
+
     def set_buffer(self, buffer: str) -> None:
-        self._buffer = buffer
-        self._cursor = len(buffer)
+        self._set_line(buffer)
+
+    def get_buffer(self) -> str:
+        return self._line.text()
+
+    def _write_line_buffer(self) -> None:
+        line = self._line
+        self.write_bytes(line.head())
+
+        tail = line.tail()
+        if tail:
+            self.write_bytes(tail)
+            self.write(f"\33[{line.width(line.cursor, len(line))}D")
+
+    def _text_width(self, text: str) -> int:
+        if not self._line.utf8:
+            return len(text)
+
+        width = 0
+        for char in text:
+            width += char_width(ord(char))
+
+        return width
+
+    def _prompt_width(self) -> int:
+        # width of the last line of the prompt without escape sequences
+        text = self._prompt_string
+        text = text[text.rfind("\n") + 1 :]
+        width = 0
+        position = 0
+        while position < len(text):
+            if text[position] == "\33" and text[position + 1 : position + 2] == "[":
+                position += 2
+                while position < len(text) and not "@" <= text[position] <= "~":
+                    position += 1
+
+            else:
+                width += self._text_width(text[position])
+
+            position += 1
+
+        return width
+
+    def _write_candidates(self, candidates: list) -> None:
+        widths = [self._text_width(candidate) for candidate in candidates]
+        column_width = max(widths) + 2
+        columns = max(1, self._list_width // column_width)
+        rows = (len(candidates) + columns - 1) // columns
+        pages = (rows + self._list_rows - 1) // self._list_rows
+        page = self._autocomplete_page % pages
+
+        # the page is written under the prompt line, which is not written
+        # again, the cursor goes back up to its column
+        output = ["\r\n\33[J"]
+        lines = 1
+        index = page * self._list_rows * columns
+        end = min(index + self._list_rows * columns, len(candidates))
+        while index < end:
+            output.append(candidates[index])
+            index += 1
+
+            if index % columns == 0 or index == end:
+                output.append("\r\n")
+                lines += 1
+            else:
+                output.append(" " * (column_width - widths[index - 1]))
+
+        if pages > 1:
+            output.append(f"--{page + 1}/{pages}--\r\n")
+            lines += 1
+
+        line = self._line
+        column = self._prompt_width() + line.width(0, line.cursor)
+        output.append(f"\33[{lines}A\33[{column + 1}G")
+        self.write("".join(output))
+        self._list_shown = True
 
     def _clear_screen(self, clear_buffer=False) -> None:
         self.write(f"\33[2J\33[1;1H")
@@ -48,32 +245,110 @@ class Prompt(Input, Autocomplete, History):
             self._clear()
             return
 
-        self.write(self._prompt_string + self._buffer)
-        pos = len(self._buffer) - self._cursor
-        self.write(f"\33[{pos}D")
+        self.write(self._prompt_string)
+        self._write_line_buffer()
+
+    def get_replace_bytes(self) -> int:
+        return self._replace_bytes
+
+    def _replace_buffer(self, new_buffer, cursor=None):
+        line = self._line
+        byte_at = line.byte_at
+        new_data = bytes(new_buffer, self._io_encoding)
+        len_buffer = len(line)
+        len_new_buffer = len(new_data)
+        same_length = min(len_buffer, len_new_buffer)
+
+        prefix = 0
+        while prefix < same_length and byte_at(prefix) == new_data[prefix]:
+            prefix += 1
+
+        suffix = 0
+        same_length -= prefix
+        end = len_buffer - 1
+        new_end = len_new_buffer - 1
+        while (
+            suffix < same_length
+            and byte_at(end - suffix) == new_data[new_end - suffix]
+        ):
+            suffix += 1
+
+        if cursor is None:
+            position = len_new_buffer
+        else:
+            position = line.encoded_length(new_buffer[:cursor])
+
+        if prefix + suffix == len_buffer == len_new_buffer:
+            if cursor is not None:
+                self._move_cursor(position - line.cursor)
 
-    def _replace_buffer(self, new_buffer):
-        if new_buffer == self._buffer:
+            self._replace_bytes = 0
             return
 
-        self._move_cursor(-self._cursor)
-        self._clear()
-        self.write(f"\33[K")
-        self._add_chars(new_buffer)
+        # keep both parts on character boundaries
+        while prefix < len_new_buffer and new_data[prefix] & 0xC0 == 0x80:
+            prefix -= 1
+
+        while suffix and new_data[len_new_buffer - suffix] & 0xC0 == 0x80:
+            suffix -= 1
+
+        removed = len_buffer - prefix - suffix
+        inserted = str(new_data[prefix : len_new_buffer - suffix], self._io_encoding)
+        output = []
+
+        cursor = line.cursor
+        if prefix < cursor:
+            output.append(f"\33[{line.width(prefix, cursor)}D")
+
+        elif prefix > cursor:
+            output.append(f"\33[{line.width(cursor, prefix)}C")
+
+        removed_width = line.width(prefix, prefix + removed)
+        if self._edit_listener is not None:
+            removed_text = line.text(prefix, prefix + removed)
+
+        if len_new_buffer > line.free + len_buffer:
+            line.resize(len_new_buffer)
+
+        line.move(prefix - cursor)
+        line.delete(removed)
+        line.insert(inserted)
+        inserted_end = line.cursor
+
+        if self._edit_listener is not None:
+            self._edited(prefix, removed_text, inserted)
+        inserted_width = line.width(prefix, inserted_end)
+        line.move(position - inserted_end)
+
+        if inserted_width > removed_width:
+            output.append(f"\33[{inserted_width - removed_width}@")
+
+        output.append(inserted)
+
+        if removed_width > inserted_width:
+            output.append(f"\33[{removed_width - inserted_width}P")
+
+        if position > inserted_end:
+            output.append(f"\33[{line.width(inserted_end, position)}C")
+
+        elif position < inserted_end:
+            output.append(f"\33[{line.width(position, inserted_end)}D")
+
+        output = "".join(output)
+        self.write(output)
+        self._replace_bytes = len(bytes(output, self._io_encoding))
 
     def _move_cursor(self, count):
+        line = self._line
+        cursor = line.cursor
+        count = line.move(count)
+
         if count < 0:
-            count = max(count, -self._cursor)
-            abs_count = abs(count)
-            if abs_count:
-                self.write(f"\33[{abs_count}D")
+            self.write(f"\33[{line.width(cursor + count, cursor)}D")
 
         elif count > 0:
-            count = min(count, len(self._buffer) - self._cursor)
-            if count:
-                self.write(f"\33[{count}C")
+            self.write(f"\33[{line.width(cursor, cursor + count)}C")
 
-        self._cursor += count
         return count
 
     def _set_copy_text(self, key, count, text):
@@ -87,68 +362,82 @@ class Prompt(Input, Autocomplete, History):
             self._copy_text = text
 
     def _remove_chars(self, count, copy_on_key=None):
-        buffer = self._buffer
+        line = self._line
         if count < 0:
-            if self._cursor == 0:
+            if line.cursor == 0:
                 return
 
             count = abs(self._move_cursor(count))
 
-        elif count > 0:
-            count = min(count, len(buffer) - self._cursor)
-
         if copy_on_key:
             self._set_copy_text(
-                copy_on_key, count, buffer[self._cursor : self._cursor + count]
+                copy_on_key, count, line.text(line.cursor, line.cursor + count)
             )
 
-        self._buffer = buffer[: self._cursor] + buffer[self._cursor + count :]
+        count = min(count, len(line) - line.cursor)
+        width = line.width(line.cursor, line.cursor + count)
+        if self._edit_listener is not None:
+            removed = line.text(line.cursor, line.cursor + count)
+
+        if line.delete(count) and width:
+            self.write(f"\33[{width}P")
 
-        self.write(f"\33[{count}P")
+        if self._edit_listener is not None and count:
+            self._edited(line.cursor, removed, "")
 
     def _add_chars(self, chars):
-        if len(self._buffer) + len(chars) > self._max_length:
+        line = self._line
+        if line.char_count() + len(chars) > self._max_length:
             return
 
-        if self._cursor == len(self._buffer):
-            self._buffer += chars
-            self._cursor += len(chars)
-            self.write(chars)
+        start = line.cursor
+        line.insert(chars)
+        self.write(chars)
+
+        if self._edit_listener is not None:
+            self._edited(start, "", chars)
+
+        tail = line.tail()
+        if tail:
+            self.write_bytes(tail)
+            self.write(f"\33[{line.width(line.cursor, len(line))}D")
+
+    def _paste_chars(self, chars):
+        free = self._max_length - self._line.char_count()
+        if free <= 0:
             return
 
-        rest = self._buffer[self._cursor :]
-        self._buffer = self._buffer[: self._cursor] + chars + rest
-        self._cursor += len(chars) + len(rest)
-        self.write(f"{chars}{rest}")
-        self._move_cursor(-len(rest))
+        self._add_chars(chars[:free])
 
     def _get_word_start(self):
-        buffer = self._buffer
-        i = self._cursor - 1
+        byte_at = self._line.byte_at
+        cursor = self._line.cursor
+        i = cursor - 1
 
-        while i >= 0 and buffer[i] in [" "]:
+        while i >= 0 and byte_at(i) == 32:
             i -= 1
 
-        while i >= 0 and buffer[i] not in [" "]:
+        while i >= 0 and byte_at(i) != 32:
             i -= 1
 
-        return i - self._cursor + 1
+        return i - cursor + 1
 
     def _get_word_end(self):
-        buffer = self._buffer
-        i = self._cursor
-        len_buffer = len(buffer)
+        byte_at = self._line.byte_at
+        cursor = self._line.cursor
+        i = cursor
+        len_buffer = len(self._line)
 
-        while i < len_buffer and buffer[i] in [" "]:
+        while i < len_buffer and byte_at(i) == 32:
             i += 1
 
-        while i < len_buffer and buffer[i] not in [" "]:
+        while i < len_buffer and byte_at(i) != 32:
             i += 1
 
-        return i - self._cursor
+        return i - cursor
 
     def _internal_commands(self) -> tuple:
-        buffer = self._buffer.strip()
+        buffer = self._line.text().strip()
         buffer_len = len(buffer)
 
         if self._history_enabled and buffer_len > 0:
@@ -174,119 +463,285 @@ class Prompt(Input, Autocomplete, History):
 
         return False, buffer
 
-    def _process_key(self, type: int, key: str) -> bool:
-        if not key == "CTRL_I" and self._autocomplete_enabled:  # NOT a Tab key
-            self.autocomplete_clean()
+    def set_keymap(self, keymap: dict, command_keymap: dict = None) -> None:
+        self._keymap = self._build_keymap(keymap)
+        if command_keymap is None:
+            # a keymap switching to the command mode needs its key bindings
+            command_mode = type(self)._key_vi_command_mode
+            if command_mode in self._keymap.values():
+                command_keymap = self.KEYMAP_VI_COMMAND
+
+        self._keymap_command = self._build_keymap(command_keymap or {})
+        self._keymap_command_mode = False
+
+    def _build_keymap(self, keymap: dict) -> dict:
+        cls = type(self)
+        return {
+            self._keymap_code(key): (
+                getattr(cls, handler) if isinstance(handler, str) else handler
+            )
+            for key, handler in keymap.items()
+        }
 
-        if type == self.INPUT_CHAR:
-            self._add_chars(key)
-            return True
+    def _keymap_code(self, key: [str, int]) -> int:
+        return self.key_code(key) if isinstance(key, str) else key
 
-        if key == "LEFT" or key == "CTRL_B":
-            self._move_cursor(-1)
+    def bind(
+        self, key: [str, int], handler: object, command_mode: bool = False
+    ) -> None:
+        assert callable(handler), "Handler must be callable"
+        keymap = self._keymap_command if command_mode else self._keymap
+        keymap[self._keymap_code(key)] = handler
 
-        elif key == "RIGHT" or key == "CTRL_F":
-            self._move_cursor(1)
+    def unbind(self, key: [str, int], command_mode: bool = False) -> None:
+        keymap = self._keymap_command if command_mode else self._keymap
+        keymap.pop(self._keymap_code(key), None)
 
-        elif key == "HOME" or key == "CTRL_A":
-            self._move_cursor(-self._cursor)
+    def _key_backward_char(self, key: int) -> bool:
+        self._move_cursor(self._line.char_offset(-1))
 
-        elif key == "END" or key == "CTRL_E":
-            self._move_cursor(len(self._buffer) - self._cursor)
+    def _key_forward_char(self, key: int) -> bool:
+        self._move_cursor(self._line.char_offset(1))
 
-        elif key == "BACKSPACE" or key == "CTRL_H":
-            self._remove_chars(-1)
+    def _key_beginning_of_line(self, key: int) -> bool:
+        self._move_cursor(-self._line.cursor)
 
-        elif key == "DELETE":
-            self._remove_chars(1)
+    def _key_end_of_line(self, key: int) -> bool:
+        self._move_cursor(len(self._line) - self._line.cursor)
 
-        elif key == "CTRL_I" and self._autocomplete_enabled and self._commands_enabled:
-            self._replace_buffer(self.autocomplete_process(self._buffer))
+    def _key_backward_delete_char(self, key: int) -> bool:
+        self._remove_chars(self._line.char_offset(-1))
 
-        elif key == "CTRL_K":
-            self._remove_chars(len(self._buffer) - self._cursor, key)
+    def _key_delete_char(self, key: int) -> bool:
+        self._remove_chars(self._line.char_offset(1))
 
-        elif key == "CTRL_U":
-            self._remove_chars(-self._cursor, key)
+    def _key_complete(self, key: int) -> bool:
+        if not self._autocomplete_enabled or not self._commands_enabled:
+            return False
 
-        elif key == "ALT_B":
-            self._move_cursor(self._get_word_start())
+        line = self._line
+        entry, cursor = self.autocomplete_process_at(
+            line.text(), len(line.text(0, line.cursor))
+        )
+        self._replace_buffer(entry, cursor)
 
-        elif key == "CTRL_W":
-            self._remove_chars(self._get_word_start(), key)
+        if self.autocomplete_listing():
+            self._write_candidates(self.autocomplete_candidates())
 
-        elif key == "ALT_D":
-            self._remove_chars(self._get_word_end(), key)
+    def _key_kill_line(self, key: int) -> bool:
+        self._remove_chars(len(self._line) - self._line.cursor, key)
 
-        elif key == "ALT_F":
-            self._move_cursor(self._get_word_end())
+    def _key_unix_line_discard(self, key: int) -> bool:
+        self._remove_chars(-self._line.cursor, key)
 
-        elif key == "CTRL_L" and self._clear_screen_enabled:
-            self._clear_screen()
+    def _key_backward_word(self, key: int) -> bool:
+        self._move_cursor(self._get_word_start())
 
-        elif key == "CTRL_Y" and self._copy_text:
-            self._add_chars(self._copy_text)
+    def _key_forward_word(self, key: int) -> bool:
+        self._move_cursor(self._get_word_end())
 
-        elif (
-            (key == "UP" or key == "CTRL_P")
-            and self._history_enabled
-            and self._commands_enabled
-        ):
-            self._replace_buffer(self.history_action(self.HISTORY_PREV, self._buffer))
+    def _key_unix_word_rubout(self, key: int) -> bool:
+        self._remove_chars(self._get_word_start(), key)
 
-        elif (
-            (key == "DOWN" or key == "CTRL_N")
-            and self._history_enabled
-            and self._commands_enabled
-        ):
-            self._replace_buffer(self.history_action(self.HISTORY_NEXT, self._buffer))
+    def _key_kill_word(self, key: int) -> bool:
+        self._remove_chars(self._get_word_end(), key)
+
+    def _key_clear_screen(self, key: int) -> bool:
+        if not self._clear_screen_enabled:
+            return False
+
+        self._clear_screen()
+
+    def _key_yank(self, key: int) -> bool:
+        if not self._copy_text:
+            return False
+
+        self._add_chars(self._copy_text)
+
+    def _history_move(self, action: int) -> bool:
+        if not self._history_enabled or not self._commands_enabled:
+            return False
+
+        self._replace_buffer(self.history_action(action, self._line.text()))
+
+    def _key_previous_history(self, key: int) -> bool:
+        return self._history_move(self.HISTORY_PREV)
+
+    def _key_next_history(self, key: int) -> bool:
+        return self._history_move(self.HISTORY_NEXT)
+
+    def _key_reverse_search(self, key: int) -> bool:
+        if not self._history_enabled or not self._commands_enabled:
+            return False
+
+        self._search_active = True
+        self._search_text = ""
+        self._search_original = self._line.text()
+        self._search_index = -1
+        self._search_failed = False
+        self._search_write()
+
+    def _search_write(self) -> None:
+        entry = self._history_at(self._search_index) if self._search_index >= 0 else ""
+        label = "failed reverse-i-search" if self._search_failed else "reverse-i-search"
+        self.write(f"\r\33[K({label})`{self._search_text}': {entry}")
+
+    def _search_find(self, start: int) -> None:
+        index = self.history_search(self._search_text, start)
+        self._search_failed = index < 0
+        if index >= 0:
+            self._search_index = index
+
+    def _search_finish(self, entry: str) -> None:
+        self._search_active = False
+        self._set_line(entry)
+        self.write("\r\33[K" + self._prompt_string)
+        self._write_line_buffer()
+
+    def _search_key(self, type: int, code: int, text: str) -> bool:
+        index = self._search_index
+
+        if type == self.INPUT_CHAR:
+            # the current hit is checked first, a longer text can only match
+            # the same or an older entry
+            self._search_text += text
+            self._search_find(index if index >= 0 else None)
+
+        elif code == self.KEY_BACKSPACE or code == self.key_code("CTRL_H"):
+            self._search_text = self._search_text[:-1]
+            self._search_failed = False
+
+        elif code == self._last_key:
+            # the key which started the search looks for an older entry
+            self._search_find(index - 1 if index >= 0 else None)
+
+        elif code == self.key_code("CTRL_G") or code == self.KEY_CTRL_C:
+            self._search_finish(self._search_original)
+            return True
 
         else:
+            # any other key accepts the found entry and is processed as usual
+            if index >= 0:
+                self._search_finish(self._history_at(index))
+            else:
+                self._search_finish(self._search_original)
+
             return False
 
-        self._last_key = key
+        self._search_write()
+        return True
+
+    def _key_vi_command_mode(self, key: int) -> bool:
+        self._keymap_command_mode = True
+
+    def _key_vi_insert_mode(self, key: int) -> bool:
+        self._keymap_command_mode = False
+
+    def _key_vi_append(self, key: int) -> bool:
+        self._move_cursor(self._line.char_offset(1))
+        self._keymap_command_mode = False
+
+    def _key_vi_append_eol(self, key: int) -> bool:
+        self._key_end_of_line(key)
+        self._keymap_command_mode = False
+
+    def _key_vi_insert_bol(self, key: int) -> bool:
+        self._key_beginning_of_line(key)
+        self._keymap_command_mode = False
+
+    def _process_key(self, type: int, code: int, text: str) -> bool:
+        if self._keymap_command_mode:
+            handler = self._keymap_command.get(code, None)
+        else:
+            handler = self._keymap.get(code, None)
+
+        # the completion state is kept only for keys bound to the completion
+        complete = self.__class__._key_complete
+        if handler is not complete and self._autocomplete_enabled:
+            self.autocomplete_clean()
+
+        if self._search_active and self._search_key(type, code, text):
+            return True
+
+        if handler is None:
+            if self._keymap_command_mode:
+                # text typed in the command mode is ignored
+                return type == self.INPUT_CHAR or type == self.INPUT_DATA
+
+            if type == self.INPUT_CHAR:
+                self._add_chars(text)
+                return True
+
+            if type == self.INPUT_DATA:
+                self._paste_chars(text)
+                return True
+
+            return False
+
+        if handler(self, code) is False:
+            return False
+
+        self._last_key = code
 
         return True
 
     def keyboard_interrupt(self) -> None:
-        self.write("\r\n")
+        self.write("\r\n\33[J" if self._list_shown else "\r\n")
+        self._list_shown = False
         self._clear()
+        self._keymap_command_mode = False
+        self._search_active = False
         self._new_prompt_string = True
 
-    def read_non_blocking(self, prompt_string: str = "> ") -> str:
-        if self._new_prompt_string:
-            self._new_prompt_string = False
-            self._prompt_string = prompt_string
-            self.write(prompt_string)
-            if self._buffer:
-                self.write(self._buffer)
-            else:
-                self._clear()
-
-        type, key = self.input_read_key()
+    def _process_enter(self, prompt_string: str) -> str:
+        self.write("\r\n\33[J" if self._list_shown else "\r\n")
+        self._list_shown = False
+        buffer = self._line.text()
 
-        if type is None:
-            return None
+        if self._commands_enabled:
+            is_internal, buffer = self._internal_commands()
+            if is_internal:
+                self.write(prompt_string)
+                self._clear()
+                return None
 
-        # print(type, key)
+        if self._history_enabled:
+            self.history_append(buffer)
 
-        key_processed = self._process_key(type, key)
-        if key_processed:
-            return None
+        self._new_prompt_string = True
+        self._keymap_command_mode = False
+        self._clear()
+        return buffer
+
+    def read_non_blocking(
+        self, prompt_string: str = "> ", max_keys: int = 1, deadline_us: int = None
+    ) -> str:
+        try:
+            self.history_poll()
+
+            if self._new_prompt_string:
+                self._new_prompt_string = False
+                self._prompt_string = prompt_string
+                if self._bracketed_paste_enabled:
+                    self.write("\33[?2004h")
+                self.write(prompt_string)
+                if len(self._line):
+                    self._line.move(len(self._line))
+                    self.write_bytes(self._line.head())
+                else:
+                    self._clear()
 
-        if key == "CTRL_M":
-            self.write("\r\n")
+            for type, code, text in self.input_read_events(max_keys, deadline_us):
+                key_processed = self._process_key(type, code, text)
+                if key_processed:
+                    continue
 
-            if self._commands_enabled:
-                is_internal, buffer = self._internal_commands()
-                if is_internal:
-                    self.write(prompt_string)
-                    self._clear()
-                    return None
+                if code == self.KEY_ENTER:
+                    buffer = self._process_enter(prompt_string)
+                    if buffer is not None:
+                        return buffer
 
-            if self._history_enabled:
-                self.history_append(buffer)
+            return None
 
-            self._new_prompt_string = True
-            self._clear()
-            return buffer
+        finally:
+            self.flush()
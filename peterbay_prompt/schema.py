@@ -0,0 +1,278 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 Petr Vavrin / pvavrin@gmail.com
+#
+# SPDX-License-Identifier: MIT
+
+_SCHEMA_TRUE = ("true", "1", "yes", "y", "on")
+_SCHEMA_FALSE = ("false", "0", "no", "n", "off")
+
+
+def _schema_bool(value: str) -> bool:
+    lower_value = value.lower()
+    if lower_value in _SCHEMA_TRUE:
+        return True
+
+    if lower_value in _SCHEMA_FALSE:
+        return False
+
+    raise ValueError()
+
+
+# attributes of Arguments which can't be used as names of values
+_SCHEMA_RESERVED = ("command", "values", "get")
+
+_SCHEMA_TYPES = {
+    "str": str,
+    "int": lambda value: int(value, 0),
+    "float": float,
+    "bool": _schema_bool,
+}
+
+
+class SchemaError(Exception):
+    pass
+
+
+class Arguments:
+    def __init__(self, command: str, values: dict) -> None:
+        self.command = command
+        self.values = values
+        for name, value in values.items():
+            setattr(self, name.replace("-", "_"), value)
+
+    def get(self, name: str, default=None):
+        return self.values.get(name, default)
+
+
+class Schema:
+    # schema = {
+    #     "help": "text",
+    #     "options": {name: {"type", "aliases", "default", "required", "choices",
+    #                        "help"}},
+    #     "positional": [{"name", "type", "required", "multiple", "choices",
+    #                     "default", "help"}],
+    # }
+    def __init__(self, command: str, schema: dict) -> None:
+        self.command = command
+        self.help = schema.get("help", "")
+        self._options = {}
+        self._option_list = []
+        self._positional = []
+        self._defaults = {}
+        self._required = []
+
+        for name, rules in schema.get("options", {}).items():
+            option = self._compile(name, rules, "--" + name)
+            option["aliases"] = list(rules.get("aliases", ()))
+            option["flag"] = option["type"] == "bool"
+            self._option_list.append(option)
+
+            for spelling in [name] + option["aliases"]:
+                assert spelling not in self._options, f"Duplicate option {spelling}"
+                self._options[spelling] = option
+
+            if option["required"]:
+                self._required.append(option)
+            else:
+                default = False if option["flag"] else None
+                self._defaults[name] = rules.get("default", default)
+
+        positional = schema.get("positional", ())
+        for index, rules in enumerate(positional):
+            name = rules["name"]
+            argument = self._compile(name, rules, f"<{name}>")
+            argument["multiple"] = rules.get("multiple", False)
+            assert not argument["multiple"] or index == len(positional) - 1, (
+                "Only the last positional argument can be multiple"
+            )
+            self._positional.append(argument)
+            if not argument["required"]:
+                default = [] if argument["multiple"] else None
+                self._defaults[name] = rules.get("default", default)
+
+    def _compile(self, name: str, rules: dict, label: str) -> dict:
+        assert name.replace("-", "_") not in _SCHEMA_RESERVED, f"Reserved name {name}"
+        type = rules.get("type", "str")
+        assert type in _SCHEMA_TYPES, f"Unknown type {type}"
+        convert = _SCHEMA_TYPES[type]
+        choices = rules.get("choices", None)
+
+        return {
+            "name": name,
+            "label": label,
+            "type": type,
+            "convert": convert,
+            "choices": None if choices is None else [convert(str(c)) for c in choices],
+            "required": rules.get("required", False),
+            "help": rules.get("help", ""),
+        }
+
+    def _convert(self, spec: dict, value: str):
+        try:
+            converted = spec["convert"](value)
+        except ValueError:
+            label = spec["label"]
+            raise SchemaError(f"{label}: invalid {spec['type']} value '{value}'")
+
+        choices = spec["choices"]
+        if choices is not None and converted not in choices:
+            allowed = ", ".join(str(choice) for choice in choices)
+            raise SchemaError(f"{spec['label']}: must be one of {allowed}")
+
+        return converted
+
+    def parse(self, tokens: list) -> Arguments:
+        values = dict(self._defaults)
+        positional = []
+        command = None
+
+        pending = None
+
+        for token in tokens:
+            type = token["type"]
+
+            if type == "text":
+                if pending is not None:
+                    values[pending["name"]] = self._convert(pending, token["content"])
+                    pending = None
+
+                elif command is None:
+                    command = token["content"]
+
+                else:
+                    positional.append(token["content"])
+
+            elif type in ("option", "long_option", "key_value"):
+                if pending is not None:
+                    raise SchemaError(f"{pending['label']}: value required")
+
+                name = token["name"]
+                option = self._options.get(name, None)
+                if option is None:
+                    prefix = {"option": "-", "long_option": "--"}.get(type, "")
+                    raise SchemaError(f"unknown option {prefix}{name}")
+
+                content = token["content"]
+                if content is not True:
+                    values[option["name"]] = self._convert(option, content)
+
+                elif option["flag"]:
+                    values[option["name"]] = True
+
+                else:
+                    # the value is the next word, "--bus 1" or "-b 1"
+                    pending = option
+
+        if pending is not None:
+            raise SchemaError(f"{pending['label']}: value required")
+
+        for option in self._required:
+            if option["name"] not in values:
+                raise SchemaError(f"{option['label']}: required")
+
+        count = len(positional)
+        arguments = self._positional
+        if count > len(arguments) and not (arguments and arguments[-1]["multiple"]):
+            raise SchemaError(f"too many arguments, expected {len(arguments)}")
+
+        for index, argument in enumerate(arguments):
+            name = argument["name"]
+
+            if argument["multiple"]:
+                if index < count:
+                    values[name] = [
+                        self._convert(argument, value) for value in positional[index:]
+                    ]
+                elif argument["required"]:
+                    raise SchemaError(f"missing argument {argument['label']}")
+
+            elif index < count:
+                values[name] = self._convert(argument, positional[index])
+
+            elif argument["required"]:
+                raise SchemaError(f"missing argument {argument['label']}")
+
+        return Arguments(command or self.command, values)
+
+    def usage(self) -> str:
+        usage = [self.command]
+        if self._option_list:
+            usage.append("[options]")
+
+        for argument in self._positional:
+            label = argument["label"] + ("..." if argument["multiple"] else "")
+            usage.append(label if argument["required"] else f"[{label}]")
+
+        return " ".join(usage)
+
+    def help_lines(self) -> list:
+        lines = []
+        if self.help:
+            lines.append(f"{self.command} - {self.help}")
+
+        lines.append(f"Usage: {self.usage()}")
+
+        described = [argument for argument in self._positional if argument["help"]]
+        if described:
+            lines.append("Arguments:")
+            for argument in described:
+                lines.append(f"  {argument['label']:<22} {argument['help']}")
+
+        if self._option_list:
+            lines.append("Options:")
+
+        for option in self._option_list:
+            spellings = [
+                ("-" if len(alias) == 1 else "--") + alias
+                for alias in option["aliases"]
+            ]
+            spellings.append(option["label"])
+            label = ", ".join(spellings)
+            if not option["flag"]:
+                choices = option["choices"]
+                if choices is None:
+                    label += "=" + option["type"].upper()
+                else:
+                    label += "=" + "|".join(str(choice) for choice in choices)
+
+            description = option["help"]
+            default = self._defaults.get(option["name"], None)
+            if option["required"]:
+                description += " (required)"
+            elif default is not None and not option["flag"]:
+                description += f" (default: {default})"
+
+            lines.append(f"  {label:<22} {description.strip()}".rstrip())
+
+        return lines
+
+    def complete(self, kind: str, name, prefix: str) -> list:
+        if kind == "long_option":
+            return [
+                option["name"] if option["flag"] else option["name"] + "="
+                for option in self._option_list
+            ]
+
+        if kind == "value":
+            spec = self._options.get(name, None)
+
+        elif kind == "argument" and name < len(self._positional):
+            spec = self._positional[name]
+
+        elif kind == "argument" and self._positional:
+            spec = self._positional[-1]
+            if not spec["multiple"]:
+                return None
+
+        else:
+            return None
+
+        if spec is None:
+            return None
+
+        if spec["choices"] is not None:
+            return [str(choice) for choice in spec["choices"]]
+
+        if spec["type"] == "bool":
+            return ["true", "false"]
+
+        return None
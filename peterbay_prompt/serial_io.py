@@ -3,15 +3,106 @@
 # SPDX-License-Identifier: MIT
 
 
+class WriteBuffer:
+    def __init__(self, serial_write: object) -> None:
+        self._serial_write = serial_write
+        self._buffer = None
+        self._length = 0
+        self._threshold = 0
+        self.bytes = 0
+        self.flushes = 0
+
+    def set_size(self, size: int, threshold: int = None) -> None:
+        assert size >= 0, "Buffer size must be positive"
+        assert threshold is None or 0 < threshold <= size, "Invalid flush threshold"
+
+        self.flush()
+        self._buffer = bytearray(size) if size else None
+        self._threshold = threshold if threshold else size
+
+    def _write(self, data: object) -> None:
+        self._serial_write(data)
+        self.bytes += len(data)
+        self.flushes += 1
+
+    def write(self, data: bytes) -> None:
+        buffer = self._buffer
+        if buffer is None:
+            self._write(data)
+            return
+
+        start = self._length
+        end = start + len(data)
+
+        if end > len(buffer):
+            self.flush()
+            if len(data) >= len(buffer):
+                self._write(data)
+                return
+
+            start = 0
+            end = len(data)
+
+        buffer[start:end] = data
+        self._length = end
+
+        if end >= self._threshold:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._length:
+            return
+
+        self._write(memoryview(self._buffer)[: self._length])
+        self._length = 0
+
+
 class SerialIO:
     def __init__(self, serial: object) -> None:
         self._serial = serial
         self._serial_read = serial.read
         self._serial_write = serial.write
         self._serial.timeout = 0.03
+        self._io_output = WriteBuffer(serial.write)
+        self._io_encoding = "ascii"
+        self._io_children = []
+
+    def _io_share(self, other: object) -> None:
+        other._io_output = self._io_output
+        self._io_children.append(other)
+
+    def enable_utf8(self, value: bool) -> None:
+        self._io_encoding = "utf-8" if value else "ascii"
+
+        for child in self._io_children:
+            child.enable_utf8(value)
+
+    def enable_write_buffer(
+        self, value: bool, size: int = 256, threshold: int = None
+    ) -> None:
+        if value:
+            self._io_output.set_size(size, threshold)
+        else:
+            self._io_output.set_size(0)
+
+    def get_write_stats(self) -> dict:
+        return {
+            "bytes": self._io_output.bytes,
+            "flushes": self._io_output.flushes,
+        }
+
+    def reset_write_stats(self) -> None:
+        self._io_output.bytes = 0
+        self._io_output.flushes = 0
+
+    def flush(self) -> None:
+        self._io_output.flush()
 
     def write(self, text: str) -> None:
-        self._serial_write(bytes(text, "ascii"))
+        self._io_output.write(bytes(text, self._io_encoding))
+
+    def write_bytes(self, data: bytes) -> None:
+        self._io_output.write(data)
 
     def write_line(self, text: str) -> None:
-        self._serial_write(bytes(text + "\r\n", "ascii"))
+        self._io_output.write(bytes(text + "\r\n", self._io_encoding))
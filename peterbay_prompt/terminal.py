@@ -6,26 +6,195 @@ from .serial_io import SerialIO
 from .prompt import Prompt
 from .tokenizer import Tokenizer
 from .alias import Alias
+from .schema import Schema, SchemaError
+
+_TERMINAL_PARSE_CACHE_SIZE = 8
 
 
 class Terminal(SerialIO):
-    _commands = {}
+    _commands = []
     _help_message = ""
     _internal_commands = ["alias", "clear", "unalias", "help", "history"]
+    _tokens_listener = None
+    _commands_version = 0
 
     def __init__(self, serial: object) -> None:
         super().__init__(serial)
         self.prompt = Prompt(serial)
+        self._io_share(self.prompt)
         self.tokenizer = Tokenizer()
         self.alias = Alias()
+        self._completers = {}
+        self._schemas = {}
+        self._handlers = {}
+        self._help = {}
+        self._commands_list = None
+        self._commands_list_version = None
+        self._parse_options = {"key_value": True}
+        self._schema_parse_options = {"key_value": False}
+        self._parse_cache = {}
+        self._parse_cache_order = []
+        self._parse_cache_version = None
+        self.arguments = None
+        self.alias.alias_set_tokenizer(self.tokenizer, self._command_parse_options)
+        self._commands_changed()
+        self.prompt.autocomplete_set_provider(self._complete)
 
     def set_commands(self, commands: list) -> None:
         self._commands = commands
+        self._commands_changed()
+
+    def register(
+        self,
+        name: str,
+        handler: callable,
+        help: str = "",
+        completer: callable = None,
+        schema: dict = None,
+    ) -> None:
+        # handler(terminal, tokens) is called for entered lines of the command
+        # and read_non_blocking returns its result, typed arguments of a command
+        # with a schema are in terminal.arguments
+        self._handlers[name] = handler
+        self._help[name] = help
+        self.set_completer(name, completer)
+        if schema is not None:
+            if help and "help" not in schema:
+                schema = dict(schema)
+                schema["help"] = help
+
+            self.set_schema(name, schema)
+        else:
+            self._commands_changed()
+
+    def unregister(self, name: str) -> None:
+        self._handlers.pop(name, None)
+        self._help.pop(name, None)
+        self._completers.pop(name, None)
+        self.set_schema(name, None)
+
+    def enable_strict_parsing(self, value: bool) -> None:
+        # backslash escapes, quotes inside words and errors for unterminated
+        # quotes, see Tokenizer
+        self._parse_options = {"key_value": True, "strict": value}
+        self._schema_parse_options = {"key_value": False, "strict": value}
+        self.alias.alias_compile()
+        if self._tokens_listener is not None:
+            self.set_tokens_listener(self._tokens_listener)
+
+    def set_tokens_listener(self, listener: callable) -> None:
+        # listener(text, tokens) is called with the compact tokens of the line
+        # after every change, e.g. for syntax colouring or argument hints, the
+        # tokens are updated around the edit only, see Tokenizer.tokenize_edit
+        self._tokens_listener = listener
+        self._line_text = self.prompt.get_buffer()
+        self._line_tokens = self.tokenizer.tokenize_compact(
+            self._line_text, self._parse_options
+        )
+        self.prompt.set_edit_listener(None if listener is None else self._line_edited)
+
+    def _line_edited(self, position: int, removed: str, inserted: str) -> None:
+        text = self._line_text
+        text = text[:position] + inserted + text[position + len(removed) :]
+        self._line_tokens = self.tokenizer.tokenize_edit(
+            self._line_tokens, text, position, removed, inserted, self._parse_options
+        )
+        self._line_text = text
+        self._tokens_listener(text, self._line_tokens)
+
+    def set_completer(self, command: str, completer: callable) -> None:
+        # completer(kind, name, prefix) returns candidates for one token of the
+        # command, kind is "argument" (name is its position), "long_option",
+        # "option" or "value" (name is the option or key)
+        if completer is None:
+            self._completers.pop(command, None)
+        else:
+            self._completers[command] = completer
+
+    def set_schema(self, command: str, schema: dict) -> None:
+        # the schema is compiled once, lines of the command are then parsed into
+        # self.arguments and the schema also feeds "help <command>" and completion
+        if schema is None:
+            self._schemas.pop(command, None)
+        else:
+            self._schemas[command] = Schema(command, schema)
+
+        self.alias.alias_compile()
+        self._commands_changed()
+
+    def _complete(self, text: str) -> tuple:
+        tokens = self.tokenizer.tokenize(text.lstrip(), {"key_value": True})
+
+        if not tokens:
+            return len(text), None
+
+        command = tokens[0]
+        if command["type"] != "text" or "quote" in command:
+            return None
+
+        if len(tokens) == 1:
+            return len(text) - len(command["content"]), None
+
+        completer = self._completers.get(command["content"], None)
+        if completer is None:
+            schema = self._schemas.get(command["content"], None)
+            if schema is None:
+                return None
+
+            completer = schema.complete
+
+        token = tokens[-1]
+        type = token["type"]
+        name = None
+        prefix = ""
+
+        if type == "space" or type == "text":
+            kind = "argument"
+            name = -1 if type == "text" else 0
+            for previous in tokens[1:]:
+                if previous["type"] == "text":
+                    name += 1
+
+            if type == "text":
+                prefix = token["content"]
+
+        elif type == "long_option" and "delimiter" not in token:
+            kind = "long_option"
+            prefix = token["name"]
+
+        elif type == "option":
+            kind = "option"
+            prefix = token["group"]
+
+        else:
+            kind = "value"
+            name = token["name"]
+            prefix = token["content"]
+
+        if not text.endswith(prefix):
+            return None
+
+        candidates = completer(kind, name, prefix)
+        if candidates is None:
+            return None
+
+        return len(text) - len(prefix), candidates
+
+    def _commands_changed(self) -> None:
+        self._commands_version += 1
+        self.prompt.autocomplete_set(self._get_commands_list())
 
     def _get_commands_list(self) -> list:
-        commands = self._internal_commands + self._commands
-        commands.sort()
-        return commands
+        # the sorted list is built again only after the commands changed
+        if self._commands_list_version != self._commands_version:
+            commands = set(self._internal_commands)
+            commands.update(self._commands)
+            commands.update(self._schemas)
+            commands.update(self._handlers)
+            self._commands_list = sorted(commands)
+            self._commands_list_version = self._commands_version
+
+        return self._commands_list
 
     def _process_internal_commands(self, tokens: list) -> bool:
         tokens_dict = self.tokenizer.to_dict(tokens)
@@ -41,9 +210,17 @@ class Terminal(SerialIO):
                 for alias, command in self.alias.alias_list().items():
                     self.write_line(f"  {alias} = {command}")
 
+            elif options == {"c": True} and not key_value and not positional:
+                self.write_line("Compiled aliases:")
+                for alias, command in self.alias.alias_compiled().items():
+                    self.write_line(f"  {alias} = {command}")
+
             elif key_value and not positional and not options:
                 alias_name = list(key_value)[0]
-                self.alias.alias_add(alias_name, key_value[alias_name])
+                try:
+                    self.alias.alias_add(alias_name, key_value[alias_name])
+                except ValueError as error:
+                    self.write_line(f"Invalid alias: {error}")
 
             else:
                 self.write_line("Invalid alias arguments")
@@ -59,6 +236,21 @@ class Terminal(SerialIO):
 
             return True
 
+        elif command == "help" and positional:
+            schema = self._schemas.get(positional[0], None)
+            help = self._help.get(positional[0], "")
+            if schema is not None:
+                for line in schema.help_lines():
+                    self.write_line(line)
+
+            elif help:
+                self.write_line(f"{positional[0]} - {help}")
+
+            else:
+                self.write_line(f"No help for {positional[0]}")
+
+            return True
+
         elif command == "help":
             commands = self._get_commands_list()
             if self._help_message:
@@ -80,37 +272,121 @@ class Terminal(SerialIO):
 
         return False
 
-    def _parse_buffer(self, buffer: str, level: int = 0) -> list:
-        tokens = self.tokenizer.tokenize(buffer.lstrip(), {"key_value": True})
+    def _command_parse_options(self, command: str) -> dict:
+        if command in self._schemas:
+            # option values of schema commands are separate words, so
+            # "key=value" is not split
+            return self._schema_parse_options
+
+        return self._parse_options
+
+    def _parse_line(self, buffer: str, expand_alias: bool = True) -> tuple:
+        tokenizer = self.tokenizer
+        text = buffer.lstrip()
+        tokens = tokenizer.tokenize_compact(text, self._parse_options)
+
+        type = tokens[0][0] & tokenizer.TOKEN_TYPE_MASK if tokens else None
+        if type != tokenizer.TOKEN_TEXT:
+            return text, tokens
+
+        command = tokenizer.token_content(text, tokens[0])
+        template = self.alias.alias_template(command) if expand_alias else None
+        if template is None:
+            options = self._command_parse_options(command)
+            if options is not self._parse_options:
+                tokens = tokenizer.tokenize_compact(text, options)
 
-        command = None
-        if len(tokens) > 0:
-            if tokens[0]["type"] == "text":
-                command = tokens[0]["content"]
+            return text, tokens
 
-        if command and level < 5:
-            command_rest = self.tokenizer.to_string(tokens[1:])
-            aliases = self.alias.alias_list()
-            if command in aliases:
-                return self._parse_buffer(
-                    aliases[command] + " " + command_rest, level + 1
-                )
+        alias = command
+        command, alias_text, alias_tokens, parameters = template
+        if parameters is not None:
+            # words of the line are placed into the compiled alias, the result
+            # is not expanded again
+            arguments = tokenizer.token_words(text, tokens[1:])
+            text = self.alias.alias_substitute(alias, arguments)
+            return self._parse_line(text, False)
 
-        return tokens
+        # the compiled alias replaces the first token, the rest of the line is
+        # only moved behind it
+        end = tokenizer.token_end(tokens[0])
+        options = self._command_parse_options(command)
+        if options is self._parse_options:
+            rest_tokens = tokens[1:]
+            delta = len(alias_text) - end
+        else:
+            rest_tokens = tokenizer.tokenize_compact(text[end:], options)
+            delta = len(alias_text)
+
+        text = alias_text + text[end:]
+        return text, alias_tokens + tokenizer.shift_tokens(rest_tokens, delta)
+
+    def _parse_buffer(self, buffer: str) -> list:
+        # least recently used lines are dropped from the cache, the cache is
+        # cleaned when aliases, schemas or parse options change
+        version = self.alias.alias_version()
+        if self._parse_cache_version != version:
+            self._parse_cache_version = version
+            self._parse_cache = {}
+            self._parse_cache_order = []
+
+        cache = self._parse_cache
+        order = self._parse_cache_order
+
+        parsed = cache.get(buffer, None)
+        if parsed is None:
+            parsed = self._parse_line(buffer)
+            if len(order) >= _TERMINAL_PARSE_CACHE_SIZE:
+                cache.pop(order.pop(0))
+
+            cache[buffer] = parsed
+
+        else:
+            order.remove(buffer)
+
+        order.append(buffer)
+        return self.tokenizer.tokens_to_dicts(*parsed)
 
     def keyboard_interrupt(self) -> None:
         self.prompt.keyboard_interrupt()
 
-    def read_non_blocking(self, prompt_string: str = "> ") -> list:
-        self.prompt.autocomplete_set(self._get_commands_list())
+    def read_non_blocking(
+        self, prompt_string: str = "> ", max_keys: int = 1, deadline_us: int = None
+    ) -> list:
+        try:
+            self.arguments = None
+            entry = self.prompt.read_non_blocking(prompt_string, max_keys, deadline_us)
+            if entry is None:
+                return None
 
-        entry = self.prompt.read_non_blocking(prompt_string)
-        if entry is None:
-            return None
+            try:
+                tokens = self._parse_buffer(entry)
+            except ValueError as error:
+                self.write_line(str(error))
+                return None
 
-        tokens = self._parse_buffer(entry)
-        processed = self._process_internal_commands(tokens)
-        if processed:
-            return None
+            for token in tokens:
+                if token["type"] == "error":
+                    self.write_line(f"Parse error: {token['error']}")
+                    return None
+
+            processed = self._process_internal_commands(tokens)
+            if processed:
+                return None
+
+            schema = self._schemas.get(tokens[0]["content"], None) if tokens else None
+            if schema is not None:
+                try:
+                    self.arguments = schema.parse(tokens)
+                except SchemaError as error:
+                    self.write_line(f"{schema.command}: {error}")
+                    return None
+
+            handler = self._handlers.get(tokens[0]["content"], None) if tokens else None
+            if handler is not None:
+                return handler(self, tokens)
+
+            return tokens
 
-        return tokens
+        finally:
+            self.flush()
@@ -4,122 +4,468 @@
 
 
 class Tokenizer:
+    TOKEN_TEXT = 1
+    TOKEN_SPACE = 2
+    TOKEN_OPTION = 3
+    TOKEN_LONG_OPTION = 4
+    TOKEN_KEY_VALUE = 5
+    TOKEN_ERROR = 6
+    TOKEN_TYPE_MASK = 0x0F
+    # the token range is raw text with quotes and escapes
+    TOKEN_ESCAPED = 0x10
+
+    # strict mode, a backslash escapes any character outside quotes and the
+    # quote or a backslash inside quotes, words may mix quoted and plain parts
+
     def __init__(self):
         self._long_option_delimiters = ["="]
 
     def set_long_option_delimiters(self, delimiters: list):
         self._long_option_delimiters = delimiters
 
-    def _read_until_chars(self, text: str, pos: int, chars: list) -> int:
-        len_text = len(text)
-        while pos < len_text and text[pos] not in chars:
-            pos += 1
+    def _find(self, text: str, char: str, start: int) -> int:
+        pos = text.find(char, start)
+        return len(text) if pos < 0 else pos
 
-        return pos
+    def _long_option(self, tokens: list, text: str, start: int) -> int:
+        delimiters = self._long_option_delimiters
+        end = self._find(text, " ", start)
 
-    def _read_exclude_chars(self, text: str, pos: int, chars: list) -> int:
-        len_text = len(text)
-        while pos < len_text and text[pos] in chars:
-            pos += 1
+        pos = end
+        for delimiter in delimiters:
+            found = text.find(delimiter, start, pos)
+            if found >= 0:
+                pos = found
 
-        return pos
+        if pos == end:
+            tokens.append((self.TOKEN_LONG_OPTION, -1, -1, start, pos, None))
+            return pos
 
-    def _quoted_text(self, tokens: list, text: str, start: int, quote_char: str) -> int:
-        pos = self._read_until_chars(text, start, [quote_char])
-        tokens.append(
-            {
-                "type": "text",
-                "content": text[start:pos],
-                "quote": quote_char,
-            }
-        )
-        return pos + 1
+        value = pos + 1
+        if value < len(text):
+            quote = text[value]
+            if quote == '"' or quote == "'":
+                close = self._find(text, quote, value + 1)
+                tokens.append(
+                    (self.TOKEN_LONG_OPTION, value + 1, close, start, pos, quote)
+                )
+                return close + 1
+
+        end = self._find(text, " ", value)
+        tokens.append((self.TOKEN_LONG_OPTION, value, end, start, pos, None))
+        return end
+
+    def _quote_end(self, text: str, pos: int) -> int:
+        # position of the quote closing the one at pos, or len(text)
+        quote = text[pos]
+        length = len(text)
+        pos += 1
+        while pos < length:
+            char = text[pos]
+            if char == quote:
+                return pos
+
+            pos += 2 if char == "\\" else 1
+
+        return length
+
+    def _quoted(self, text: str, start: int, end: int) -> str:
+        # first quote character when the range consists of quoted strings only
+        pos = start
+        while pos < end:
+            if text[pos] != '"' and text[pos] != "'":
+                return None
+
+            pos = self._quote_end(text, pos) + 1
+
+        return text[start] if start < end else None
+
+    def _unquote(self, raw: str) -> str:
+        if "\\" not in raw and '"' not in raw and "'" not in raw:
+            return raw
+
+        result = []
+        length = len(raw)
+        pos = 0
+        while pos < length:
+            char = raw[pos]
+            if char == "\\":
+                result.append(raw[pos + 1])
+                pos += 2
+
+            elif char == '"' or char == "'":
+                pos += 1
+                while pos < length and raw[pos] != char:
+                    escaped = raw[pos]
+                    if escaped == "\\" and raw[pos + 1] in (char, "\\"):
+                        pos += 1
+                        escaped = raw[pos]
+
+                    result.append(escaped)
+                    pos += 1
+
+                pos += 1
 
-    def _long_option(self, tokens: list, text: str, start: int) -> int:
-        pos = self._read_until_chars(text, start, self._long_option_delimiters + [" "])
-        name = text[start:pos]
-        delimiter = text[pos]
+            else:
+                result.append(char)
+                pos += 1
 
-        token = {
-            "type": "long_option",
-            "name": name,
-        }
+        return "".join(result)
 
-        if delimiter not in self._long_option_delimiters:
-            token["content"] = True
-            tokens.append(token)
-            return pos
+    def _escape(self, content: str, quote: str = None) -> str:
+        if quote is not None:
+            content = content.replace("\\", "\\\\").replace(quote, "\\" + quote)
+            return quote + content + quote
+
+        result = []
+        for char in content:
+            if char in " \"'\\=" or (char == "-" and not result):
+                result.append("\\")
+
+            result.append(char)
+
+        return "".join(result)
+
+    def _strict_word(self, tokens: list, text: str, start: int, key_value: bool):
+        length = len(text)
+        delimiters = self._long_option_delimiters
+        escaped = -1
+        split = -1
+        equal = -1
+        pos = start
+
+        while pos < length:
+            char = text[pos]
+            if char == " ":
+                break
+
+            if char == "\\":
+                if pos + 1 == length:
+                    tokens.append((self.TOKEN_ERROR, start, length, -1, -1, None))
+                    return length
+
+                escaped = pos if escaped < 0 else escaped
+                pos += 2
 
-        start = pos + 1
-
-        if len(text) > start:
-            quote = text[start]
-            if quote in ['"', "'"]:
-                pos = self._read_until_chars(text, start + 1, [quote])
-                token["content"] = text[start + 1 : pos]
-                token["quote"] = quote
-                token["delimiter"] = delimiter
-                tokens.append(token)
-                return pos + 1
-
-        pos = self._read_until_chars(text, start, [" "])
-        token["content"] = text[start:pos]
-        token["delimiter"] = delimiter
-        tokens.append(token)
-        return pos
-
-    def _short_option(self, tokens: list, text: str, start: int) -> int:
-        pos = self._read_until_chars(text, start, [" "])
-        options = text[start:pos]
-        for option in options:
+            elif char == '"' or char == "'":
+                close = self._quote_end(text, pos)
+                if close == length:
+                    tokens.append((self.TOKEN_ERROR, start, length, -1, -1, char))
+                    return length
+
+                escaped = pos if escaped < 0 else escaped
+                pos = close + 1
+
+            else:
+                if split < 0 and char in delimiters:
+                    split = pos
+
+                if equal < 0 and char == "=":
+                    equal = pos
+
+                pos += 1
+
+        end = pos
+        if text.startswith("--", start) and (escaped < 0 or 0 <= split < escaped):
+            if split < 0:
+                tokens.append((self.TOKEN_LONG_OPTION, -1, -1, start + 2, end, None))
+                return end
+
+            value = split + 1
+            flag = self.TOKEN_ESCAPED if escaped >= 0 else 0
+            quote = self._quoted(text, value, end)
             tokens.append(
-                {
-                    "type": "option",
-                    "name": option,
-                    "content": True,
-                    "group": options,
-                }
+                (self.TOKEN_LONG_OPTION | flag, value, end, start + 2, split, quote)
             )
-        return pos
+            return end
+
+        if text[start] == "-" and end - start > 1 and escaped < 0:
+            for pos in range(start + 1, end):
+                tokens.append((self.TOKEN_OPTION, pos, pos + 1, start + 1, end, None))
+            return end
+
+        if (
+            key_value
+            and start < equal
+            and (escaped < 0 or equal < escaped)
+            and text[start:equal].isalpha()
+        ):
+            type = self.TOKEN_KEY_VALUE | (self.TOKEN_ESCAPED if escaped >= 0 else 0)
+            tokens.append((type, equal + 1, end, start, equal, None))
+            return end
+
+        type = self.TOKEN_TEXT | (self.TOKEN_ESCAPED if escaped >= 0 else 0)
+        tokens.append((type, start, end, -1, -1, self._quoted(text, start, end)))
+        return end
+
+    def _tokenize_strict(
+        self, text: str, key_value: bool, limit: int, tokens: list, i: int, sync: list
+    ) -> list:
+        length = len(text)
+        count = 0
+        while i < length:
+            if text[i] == " ":
+                end = i + 1
+                while end < length and text[end] == " ":
+                    end += 1
 
-    def _text(
-        self, tokens: list, text: str, start: int, support_key_value: bool = False
-    ) -> int:
-        delimiters = [" "]
-        if support_key_value:
-            delimiters.append("=")
+                tokens.append((self.TOKEN_SPACE, i, end, -1, -1, None))
+                i = end
 
-        pos = self._read_until_chars(text, start, delimiters)
-        content = text[start:pos]
+            else:
+                i = self._strict_word(tokens, text, i, key_value)
 
-        if support_key_value:
-            if pos < len(text) and text[pos] == "=" and content.isalpha():
-                tokens.append(
-                    {
-                        "type": "key_value",
-                        "name": content,
-                        "content": text[pos + 1 :],
-                    }
-                )
-                return len(text)
+            count += 1
 
-        tokens.append(
-            {
-                "type": "text",
-                "content": content,
-            }
-        )
-        return pos
-
-    def _space(self, tokens: list, text: str, start: int) -> int:
-        pos = self._read_exclude_chars(text, start, [" "])
-        tokens.append(
-            {
-                "type": "space",
-                "content": " " + text[start:pos],
+            if sync is not None and self._resync(tokens, sync, i):
+                break
+
+            if limit is not None and count >= limit:
+                tokens.append((self.TOKEN_TEXT, i, length, -1, -1, None))
+                break
+
+        return tokens
+
+    def _tokenize_lenient(
+        self, text: str, key_value: bool, limit: int, tokens: list, i: int, sync: list
+    ) -> list:
+        append = tokens.append
+        length = len(text)
+        count = 0
+        while i < length:
+            char = text[i]
+
+            if char == '"' or char == "'":
+                end = self._find(text, char, i + 1)
+                append((self.TOKEN_TEXT, i + 1, end, -1, -1, char))
+                i = end + 1
+
+            elif char == "-":
+                start = i + 1
+                if start < length and text[start] == "-":  # long option
+                    i = self._long_option(tokens, text, start + 1)
+
+                else:  # short option
+                    end = self._find(text, " ", start)
+                    for pos in range(start, end):
+                        append((self.TOKEN_OPTION, pos, pos + 1, start, end, None))
+                    i = end
+
+            elif char == " ":
+                end = i + 1
+                while end < length and text[end] == " ":
+                    end += 1
+
+                append((self.TOKEN_SPACE, i, end, -1, -1, None))
+                i = end
+
+            else:
+                end = self._find(text, " ", i)
+                pos = text.find("=", i, end) if key_value else -1
+                if pos > i and text[i:pos].isalpha():
+                    # the value of a key is the rest of the text
+                    append((self.TOKEN_KEY_VALUE, pos + 1, length, i, pos, None))
+                    i = length
+
+                else:
+                    append((self.TOKEN_TEXT, i, end, -1, -1, None))
+                    i = end
+
+            count += 1
+
+            if sync is not None and self._resync(tokens, sync, i):
+                break
+
+            if limit is None:
+                continue
+
+            if count >= limit:
+                i = min(i, length)
+                append((self.TOKEN_TEXT, i, length, -1, -1, None))
+                break
+
+        return tokens
+
+    def tokenize_compact(self, text: str, options: dict = {}) -> list:
+        # tokens are tuples (type, start, end, name_start, name_end, quote) with
+        # offsets into the text, start is -1 for a long option without a value
+        limit = options["limit"] if "limit" in options else None
+        key_value = bool(options["key_value"]) if "key_value" in options else False
+
+        assert limit is None or limit > 0, "Limit must be positive"
+
+        if "strict" in options and options["strict"]:
+            return self._tokenize_strict(text, key_value, limit, [], 0, None)
+
+        return self._tokenize_lenient(text, key_value, limit, [], 0, None)
+
+    def token_span(self, token: tuple) -> tuple:
+        # range of the token in the source text including quotes and prefixes
+        type = token[0] & self.TOKEN_TYPE_MASK
+        if type == self.TOKEN_OPTION:
+            return token[3] - 1, token[4]
+
+        if type == self.TOKEN_LONG_OPTION:
+            return token[3] - 2, token[4] if token[1] < 0 else self.token_end(token)
+
+        if type == self.TOKEN_KEY_VALUE:
+            return token[3], token[2]
+
+        if token[0] == self.TOKEN_TEXT and token[5] is not None:
+            return token[1] - 1, token[2] + 1
+
+        return token[1], token[2]
+
+    def token_words(self, text: str, tokens: list) -> list:
+        # source text of the tokens without spaces, an option group is one word
+        words = []
+        last = -1
+        for token in tokens:
+            if token[0] & self.TOKEN_TYPE_MASK == self.TOKEN_SPACE:
+                continue
+
+            start, end = self.token_span(token)
+            if start != last:
+                words.append(text[start:end])
+                last = start
+
+        return words
+
+    def _shift(self, token: tuple, delta: int) -> tuple:
+        type, start, end, name_start, name_end, quote = token
+        if start >= 0:
+            start += delta
+            end += delta
+
+        if name_start >= 0:
+            name_start += delta
+            name_end += delta
+
+        return (type, start, end, name_start, name_end, quote)
+
+    def shift_tokens(self, tokens: list, delta: int) -> list:
+        # compact tokens moved by delta characters in the text
+        if not delta:
+            return tokens
+
+        shift = self._shift
+        return [shift(token, delta) for token in tokens]
+
+    def _resync(self, tokens: list, sync: list, pos: int) -> bool:
+        # sync is [old tokens, index, delta, end of the edit in the new text],
+        # behind the edit a token boundary at the start of an old token means
+        # the rest of the old tokens only has to be shifted
+        old, index, delta, edit_end = sync
+        if pos < edit_end:
+            return False
+
+        pos -= delta
+        span = self.token_span
+        length = len(old)
+        while index < length and span(old[index])[0] < pos:
+            index += 1
+
+        sync[1] = index
+        if index == length or span(old[index])[0] != pos:
+            return False
+
+        tokens.extend(self.shift_tokens(old[index:], delta))
+
+        return True
+
+    def tokenize_edit(
+        self,
+        tokens: list,
+        text: str,
+        position: int,
+        removed: str = "",
+        inserted: str = "",
+        options: dict = {},
+    ) -> list:
+        # updates compact tokens of a line after the removed text at position
+        # was replaced with the inserted text, text is the new line, only the
+        # tokens around the edit are lexed again
+        if "limit" in options and options["limit"] is not None:
+            return self.tokenize_compact(text, options)
+
+        key_value = bool(options["key_value"]) if "key_value" in options else False
+        span = self.token_span
+
+        # lexing starts again behind the last token ending before the position,
+        # a token ending at the position may continue with the inserted text
+        index = len(tokens)
+        while index and span(tokens[index - 1])[1] >= position:
+            index -= 1
+
+        start = span(tokens[index - 1])[1] if index else 0
+
+        sync = [tokens, index, len(inserted) - len(removed), position + len(inserted)]
+        prefix = tokens[:index]
+
+        if "strict" in options and options["strict"]:
+            return self._tokenize_strict(text, key_value, None, prefix, start, sync)
+
+        return self._tokenize_lenient(text, key_value, None, prefix, start, sync)
+
+    def token_content(self, text: str, token: tuple) -> str:
+        content = text[token[1] : token[2]]
+        if token[0] & self.TOKEN_ESCAPED:
+            return self._unquote(content)
+
+        return content
+
+    def token_end(self, token: tuple) -> int:
+        # end of the token in the source text including a closing quote
+        if token[5] is not None and not token[0] & self.TOKEN_ESCAPED:
+            return token[2] + 1
+
+        return token[2]
+
+    def token_to_dict(self, text: str, token: tuple) -> dict:
+        type, start, end, name_start, name_end, quote = token
+        content = text[start:end]
+        if type & self.TOKEN_ESCAPED:
+            type &= self.TOKEN_TYPE_MASK
+            content = self._unquote(content)
+
+        if type == self.TOKEN_TEXT:
+            if quote is None:
+                return {"type": "text", "content": content}
+
+            return {"type": "text", "content": content, "quote": quote}
+
+        if type == self.TOKEN_SPACE:
+            return {"type": "space", "content": content}
+
+        if type == self.TOKEN_OPTION:
+            return {
+                "type": "option",
+                "name": text[start],
+                "content": True,
+                "group": text[name_start:name_end],
             }
-        )
-        return pos
+
+        if type == self.TOKEN_ERROR:
+            error = "unterminated escape" if quote is None else "unterminated quote"
+            return {"type": "error", "content": content, "error": error}
+
+        name = text[name_start:name_end]
+
+        if type == self.TOKEN_KEY_VALUE:
+            return {"type": "key_value", "name": name, "content": content}
+
+        if start < 0:
+            return {"type": "long_option", "name": name, "content": True}
+
+        token = {"type": "long_option", "name": name, "content": content}
+        if quote is not None:
+            token["quote"] = quote
+
+        token["delimiter"] = text[name_end]
+        return token
+
+    def tokens_to_dicts(self, text: str, tokens: list) -> list:
+        return [self.token_to_dict(text, token) for token in tokens]
 
     def to_dict(self, tokens: list) -> dict:
         command = None
@@ -150,19 +496,24 @@ class Tokenizer:
             "key_value": key_values,
         }
 
-    def to_string(self, tokens: list) -> str:
+    def to_string(self, tokens: list, strict: bool = False) -> str:
+        # in the strict mode the text is escaped, so tokenizing it in the
+        # strict mode gives the same tokens again
         text = ""
         last_type = None
         for token in tokens:
             content = token["content"]
-
-            if "quote" in token:
-                content = token["quote"] + content + token["quote"]
-
             type = token.get("type", None)
             name = token.get("name", "")
 
-            if type in ["space", "text"]:
+            if strict and type in ["text", "long_option", "key_value"]:
+                if content is not True:
+                    content = self._escape(content, token.get("quote", None))
+
+            elif "quote" in token:
+                content = token["quote"] + content + token["quote"]
+
+            if type in ["space", "text", "error"]:
                 text += content
 
             elif type == "option":
@@ -185,46 +536,4 @@ class Tokenizer:
         return text
 
     def tokenize(self, text: str, options: dict = {}) -> list:
-        limit = options["limit"] if "limit" in options else None
-        key_value = bool(options["key_value"]) if "key_value" in options else False
-
-        assert limit is None or limit > 0, "Limit must be positive"
-
-        tokens = []
-        i = 0
-        count = 0
-        while i < len(text):
-            char = text[i]
-
-            if char in ['"', "'"]:
-                i = self._quoted_text(tokens, text, i + 1, char)
-
-            elif char == "-":
-                start = i + 1
-                if start < len(text) and text[start] == "-":  # long option
-                    i = self._long_option(tokens, text, start + 1)
-
-                else:  # short option
-                    i = self._short_option(tokens, text, start)
-
-            elif char == " ":
-                i = self._space(tokens, text, i + 1)
-
-            else:
-                i = self._text(tokens, text, i, key_value)
-
-            count += 1
-
-            if limit is None:
-                continue
-
-            if count >= limit:
-                tokens.append(
-                    {
-                        "type": "text",
-                        "content": text[i:],
-                    }
-                )
-                break
-
-        return tokens
+        return self.tokens_to_dicts(text, self.tokenize_compact(text, options))
@@ -117,14 +117,20 @@ class Value(Prompt):
             if "false" in settings["boolean"]:
                 self._boolean_false = settings["boolean"]["false"]
 
-    def read_non_blocking(self, prompt_string: str = "> ") -> str:
-        result = super().read_non_blocking(prompt_string)
-        if result is None:
+    def read_non_blocking(
+        self, prompt_string: str = "> ", max_keys: int = 1, deadline_us: int = None
+    ) -> str:
+        try:
+            result = super().read_non_blocking(prompt_string, max_keys, deadline_us)
+            if result is None:
+                return None
+
+            valid, value, error = self._validate_user_input(result, self._rules)
+            if valid:
+                return value
+
+            self.write_line(error)
             return None
 
-        valid, value, error = self._validate_user_input(result, self._rules)
-        if valid:
-            return value
-
-        self.write_line(error)
-        return None
+        finally:
+            self.flush()
@@ -15,6 +15,11 @@ class Wizard(SerialIO):
         self._single_select = SingleSelect(serial)
         self._multi_select = MultiSelect(serial)
         self._value = Value(serial)
+        self._io_share(self._single_select)
+        self._io_share(self._multi_select)
+        self._io_share(self._value)
+        self._single_select._input_share(self._multi_select)
+        self._single_select._input_share(self._value)
         self._default_values = {}
         self.reset()
 
@@ -93,18 +98,24 @@ class Wizard(SerialIO):
             if hasattr(self._active_component, "keyboard_interrupt"):
                 self._active_component.keyboard_interrupt()
 
-    def read_non_blocking(self) -> None:
-        if self._printed_index is None:
-            self._print_wizard_info()
-            self._init_wizard_entry()
+    def read_non_blocking(self, max_keys: int = 1, deadline_us: int = None) -> None:
+        try:
+            if self._printed_index is None:
+                self._print_wizard_info()
+                self._init_wizard_entry()
 
-        if self._active_component is not None:
-            result = self._active_component.read_non_blocking()
-            if result is not None:
-                self._set_value(result)
+            if self._active_component is not None:
+                result = self._active_component.read_non_blocking(
+                    max_keys=max_keys, deadline_us=deadline_us
+                )
+                if result is not None:
+                    self._set_value(result)
+
+                    next_label = self._next_entry()
+                    if not next_label:
+                        return self._results
 
-                next_label = self._next_entry()
-                if not next_label:
-                    return self._results
+                    return None
 
-                return None
+        finally:
+            self.flush()
@@ -0,0 +1,116 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 Petr Vavrin / pvavrin@gmail.com
+#
+# SPDX-License-Identifier: MIT
+
+import random
+
+import pytest
+
+from peterbay_prompt.tokenizer import Tokenizer
+
+STRICT = {"strict": True, "key_value": True}
+CHARS = "ab -=\"'\\xé"
+NAMES = "abcdefghij"
+
+
+def random_text(rng: random.Random, minimum: int = 0) -> str:
+    return "".join(rng.choice(CHARS) for _ in range(rng.randint(minimum, 8)))
+
+
+def random_name(rng: random.Random) -> str:
+    return "".join(rng.choice(NAMES) for _ in range(rng.randint(1, 5)))
+
+
+def random_tokens(rng: random.Random) -> list:
+    tokens = [{"type": "text", "content": random_text(rng, 1)}]
+    for _ in range(rng.randint(0, 6)):
+        tokens.append({"type": "space", "content": " " * rng.randint(1, 2)})
+        kind = rng.randint(0, 4)
+
+        if kind == 0:
+            tokens.append({"type": "text", "content": random_text(rng, 1)})
+
+        elif kind == 1:
+            quote = rng.choice("\"'")
+            content = random_text(rng)
+            tokens.append({"type": "text", "content": content, "quote": quote})
+
+        elif kind == 2:
+            name = random_name(rng)
+            tokens.append({"type": "long_option", "name": name, "content": True})
+
+        elif kind == 3:
+            token = {
+                "type": "long_option",
+                "name": random_name(rng),
+                "content": random_text(rng),
+            }
+            if rng.randint(0, 1):
+                token["quote"] = rng.choice("\"'")
+            token["delimiter"] = "="
+            tokens.append(token)
+
+        else:
+            name = random_name(rng)
+            content = random_text(rng)
+            tokens.append({"type": "key_value", "name": name, "content": content})
+
+    return tokens
+
+
+@pytest.fixture
+def tokenizer() -> Tokenizer:
+    return Tokenizer()
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_to_string_tokenize_round_trip(tokenizer: Tokenizer, seed: int) -> None:
+    rng = random.Random(seed)
+    for _ in range(500):
+        tokens = random_tokens(rng)
+        text = tokenizer.to_string(tokens, True)
+        assert tokenizer.tokenize(text, STRICT) == tokens, text
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_tokenize_to_string_round_trip(tokenizer: Tokenizer, seed: int) -> None:
+    rng = random.Random(seed)
+    for _ in range(2000):
+        text = random_text(rng) + random_text(rng)
+        tokens = tokenizer.tokenize(text, STRICT)
+        if any(token["type"] == "error" for token in tokens):
+            continue
+
+        written = tokenizer.to_string(tokens, True)
+        assert tokenizer.tokenize(written, STRICT) == tokens, (text, written)
+
+
+@pytest.mark.parametrize(
+    "text, content, error",
+    [
+        ('echo "abc', '"abc', "unterminated quote"),
+        ("echo 'a\\'", "'a\\'", "unterminated quote"),
+        ("echo abc\\", "abc\\", "unterminated escape"),
+    ],
+)
+def test_error_tokens(tokenizer: Tokenizer, text: str, content: str, error: str):
+    tokens = tokenizer.tokenize(text, STRICT)
+    assert tokens[-1] == {"type": "error", "content": content, "error": error}
+
+
+def test_escaped_quotes_inside_quotes(tokenizer: Tokenizer) -> None:
+    tokens = tokenizer.tokenize('echo "a \\"b\\" c"', STRICT)
+    assert tokens[-1] == {"type": "text", "content": 'a "b" c', "quote": '"'}
+
+    text = tokenizer.to_string(tokens, True)
+    assert tokenizer.tokenize(text, STRICT) == tokens
+
+
+@pytest.mark.parametrize("options", [{}, STRICT])
+def test_long_option_at_end_of_line(tokenizer: Tokenizer, options: dict) -> None:
+    tokens = tokenizer.tokenize("cmd --verbose", options)
+    assert tokens == [
+        {"type": "text", "content": "cmd"},
+        {"type": "space", "content": " "},
+        {"type": "long_option", "name": "verbose", "content": True},
+    ]